@@ -0,0 +1,80 @@
+"""Create ozon_postings, ozon_postings_products and ozon_sync_watermarks tables
+
+Revision ID: 5d1f0c7be2a4
+Revises: 3fb4c5a429b1
+Create Date: 2026-10-18 12:04:31.418220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d1f0c7be2a4"
+down_revision: Union[str, None] = "3fb4c5a429b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ozon_postings",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("client_id", sa.String(length=255), nullable=False),
+        sa.Column("posting_number", sa.String(length=255), nullable=False),
+        sa.Column("order_id", sa.BigInteger(), nullable=True),
+        sa.Column("order_number", sa.String(length=255), nullable=True),
+        sa.Column("status", sa.String(length=50), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("in_process_at", sa.DateTime(), nullable=True),
+        sa.Column(
+            "synced_at", sa.DateTime(), nullable=False, server_default=sa.func.now()
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("posting_number"),
+    )
+    op.create_index(
+        "ix_ozon_postings_client_id_created_at",
+        "ozon_postings",
+        ["client_id", "created_at"],
+    )
+
+    op.create_table(
+        "ozon_postings_products",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("posting_number", sa.String(length=255), nullable=False),
+        sa.Column("sku", sa.BigInteger(), nullable=False),
+        sa.Column("offer_id", sa.String(length=255), nullable=True),
+        sa.Column("name", sa.Text(), nullable=True),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("price", sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column("currency_code", sa.String(length=10), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["posting_number"],
+            ["ozon_postings.posting_number"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "posting_number", "sku", name="unique_posting_number_sku"
+        ),
+    )
+
+    op.create_table(
+        "ozon_sync_watermarks",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=50), nullable=False),
+        sa.Column("client_id", sa.String(length=255), nullable=False),
+        sa.Column("synced_from", sa.DateTime(), nullable=False),
+        sa.Column("synced_to", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name", "client_id", name="unique_sync_name_client_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ozon_sync_watermarks")
+    op.drop_table("ozon_postings_products")
+    op.drop_index("ix_ozon_postings_client_id_created_at", table_name="ozon_postings")
+    op.drop_table("ozon_postings")
@@ -0,0 +1,37 @@
+"""Create ozon_products table
+
+Revision ID: 9b3e6a1d47c2
+Revises: 5d1f0c7be2a4
+Create Date: 2026-10-18 15:41:09.612804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3e6a1d47c2"
+down_revision: Union[str, None] = "5d1f0c7be2a4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ozon_products",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("sku", sa.BigInteger(), nullable=False),
+        sa.Column("client_id", sa.String(length=255), nullable=False),
+        sa.Column("name", sa.Text(), nullable=True),
+        sa.Column("offer_id", sa.String(length=255), nullable=True),
+        sa.Column("price", sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("sku"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ozon_products")
@@ -0,0 +1,37 @@
+"""Add ozon_campaigns statistics index
+
+Revision ID: c7e2f91a5b38
+Revises: 9b3e6a1d47c2
+Create Date: 2026-10-18 17:12:44.208315
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c7e2f91a5b38"
+down_revision: Union[str, None] = "9b3e6a1d47c2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ozon_campaigns", sa.Column("client_id", sa.String(length=255), nullable=True)
+    )
+    # Покрывающий индекс для выборки кампаний за период без чтения таблицы
+    op.create_index(
+        "ix_ozon_campaigns_client_id_from_date",
+        "ozon_campaigns",
+        ["client_id", "from_date"],
+        unique=False,
+        postgresql_include=["campaign_id", "state", "to_date", "updated_at"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_ozon_campaigns_client_id_from_date", table_name="ozon_campaigns")
+    op.drop_column("ozon_campaigns", "client_id")
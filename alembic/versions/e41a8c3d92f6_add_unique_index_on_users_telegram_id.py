@@ -0,0 +1,44 @@
+"""Add unique index on users.telegram_id
+
+Revision ID: e41a8c3d92f6
+Revises: c7e2f91a5b38
+Create Date: 2026-10-18 18:03:27.519044
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e41a8c3d92f6"
+down_revision: Union[str, None] = "c7e2f91a5b38"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Раньше пользователь мог создаться несколько раз: оставляем
+    # последнюю обновленную запись для каждого telegram_id
+    op.execute(
+        """
+        DELETE FROM users
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT
+                    id,
+                    row_number() OVER (
+                        PARTITION BY telegram_id ORDER BY updated_at DESC, id DESC
+                    ) AS position
+                FROM users
+            ) ranked
+            WHERE position > 1
+        )
+        """
+    )
+    op.create_index("ix_users_telegram_id", "users", ["telegram_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_telegram_id", table_name="users")
@@ -0,0 +1,29 @@
+"""Add found to ozon_products
+
+Revision ID: f2b7d5c1a9e3
+Revises: e41a8c3d92f6
+Create Date: 2026-10-18 19:12:08.204517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b7d5c1a9e3"
+down_revision: Union[str, None] = "e41a8c3d92f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ozon_products",
+        sa.Column("found", sa.Boolean, nullable=False, server_default=sa.true()),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("ozon_products", "found")
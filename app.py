@@ -1,52 +1,57 @@
 import logging
+from typing import Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import Response
 
-from bot.base import setup_bot, stop_bot, feed_update, WEBHOOK_PATH
-
-from sqlalchemy import select
-from db.session import get_session
+from bot.base import setup_bot, stop_bot, update_queue, user_cache, WEBHOOK_PATH
 
 from bot.salesman import Salesman
-from transitions.extensions import GraphMachine
-from io import BytesIO
-
-from models.user import User
+from bot.state_graph import StateGraphCache
+from core.config import settings
 
 from contextlib import asynccontextmanager
 
+from services.http_pool import close_connectors
+
 logging.basicConfig(filemode="a", level=logging.INFO)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await setup_bot()
+    update_queue.start()
+    user_cache.start()
     yield
+    await update_queue.drain()
+    await user_cache.close()
     await stop_bot()
+    await close_connectors()
 
 
 app = FastAPI(openapi_url=None, lifespan=lifespan)
+state_graph = StateGraphCache(settings.state_graph_cache_dir)
 
 
 @app.post(WEBHOOK_PATH)
 async def bot_webhook(update: dict):
-    await feed_update(update)
+    await update_queue.put(update)
 
 
 @app.get("/image")
-async def get_image():
-    async with get_session() as session:
-        result = await session.execute(select(User).fetch(1))
-        model = Salesman(result.scalars().first())
-        machine = GraphMachine(
-            model=model,
-            states=Salesman.states,
-            transitions=Salesman.transitions,
-            initial="waiting_start",
-        )
-        stream = BytesIO()
-        machine.get_graph().draw(stream, prog="dot", format="png")
-        stream.seek(0)
-        image_data = stream.read()
-        return Response(content=image_data, media_type="image/png")
+async def get_image(
+    state: str = "waiting_start", if_none_match: Optional[str] = Header(None)
+):
+    if state not in Salesman.states:
+        raise HTTPException(status_code=404, detail="Unknown state")
+
+    key, image_data = await state_graph.get(state)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if if_none_match and (
+        if_none_match == "*" or etag in map(str.strip, if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=image_data, media_type="image/png", headers=headers)
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from core.config import settings
+from services.google_exporter import GoogleSheetsExporter
+from services.http_pool import close_connectors
+from services.ozon.drr_batch import OzonDRRBatchRunner
+from services.report_sinks import (
+    GoogleSheetsSink,
+    build_report_sinks,
+    write_report_sinks,
+)
+
+logging.basicConfig(
+    filemode="a",
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+yesterday = datetime.now().date() - timedelta(days=1)
+
+parser = argparse.ArgumentParser(description="DRR отчеты для всех пользователей")
+parser.add_argument("--since", type=parse_date, default=yesterday)
+parser.add_argument("--to", type=parse_date, default=yesterday)
+parser.add_argument("--workers", type=int, default=None)
+parser.add_argument("--sinks", default=settings.report_sinks)
+parser.add_argument("--archive-dir", default=settings.report_archive_dir)
+
+
+async def main(args):
+    sinks = build_report_sinks(args.sinks, args.archive_dir)
+    gsheet_urls = settings.google_sheets_urls
+    exporter = GoogleSheetsExporter(settings.google_service_account_file)
+
+    async def export(user, report):
+        # Отчеты разных продавцов не смешиваем: в Google Sheets пишем
+        # только в таблицу, настроенную для этого аккаунта
+        user_sinks = list(sinks)
+        gsheet_url = gsheet_urls.get(user.ozon_seller_client_id)
+        if gsheet_url:
+            user_sinks.append(GoogleSheetsSink(exporter, gsheet_url))
+        if not user_sinks:
+            return
+
+        await write_report_sinks(
+            user_sinks, report, user.ozon_seller_client_id, args.since, args.to
+        )
+
+    runner = OzonDRRBatchRunner(
+        args.since,
+        args.to,
+        max_workers=args.workers,
+        export=export if sinks or gsheet_urls else None,
+    )
+    try:
+        await runner.run()
+    finally:
+        await close_connectors()
+
+    if runner.errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parser.parse_args()))
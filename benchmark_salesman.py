@@ -0,0 +1,50 @@
+import asyncio
+import time
+import timeit
+
+from transitions.extensions.asyncio import AsyncMachine
+
+from bot.salesman import Salesman
+
+
+class User:
+    current_state = "settings"
+
+
+class MachinePerModel:
+    # Прежний вариант: отдельная машина на каждую модель
+    def __init__(self, user):
+        self.user = user
+        state = self.user.current_state or "waiting_start"
+        self.machine = AsyncMachine(
+            model=self,
+            states=Salesman.states,
+            transitions=Salesman.transitions,
+            initial=state,
+        )
+
+
+async def update(model_cls, number):
+    # Обработка апдейта: модель на пользователя и пара переходов
+    started_at = time.perf_counter()
+    for _ in range(number):
+        model = model_cls(User())
+        await model.set_seller_token()
+        await model.check_token()
+    return time.perf_counter() - started_at
+
+
+def report(name, seconds, number):
+    print(f"{name}: {seconds / number * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    number = 2000
+    user = User()
+
+    for model_cls in (MachinePerModel, Salesman):
+        seconds = min(timeit.repeat(lambda: model_cls(user), number=number, repeat=5))
+        report(f"{model_cls.__name__} construct", seconds, number)
+
+        seconds = asyncio.run(update(model_cls, number))
+        report(f"{model_cls.__name__} construct + 2 triggers", seconds, number)
@@ -5,9 +5,9 @@ from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, BotCommand, CallbackQuery, Update
 
-from sqlalchemy import select
-from db.session import get_session
-from models.user import User
+from core.config import settings
+from bot.update_queue import UpdateQueue
+from bot.user_cache import UserCache
 
 
 TOKEN = os.getenv('TELEGRAM_TOKEN')
@@ -34,6 +34,11 @@ async def feed_update(update: dict):
     telegram_update = Update(**update)
     await dp.feed_update(bot, telegram_update)
 
+# Вебхук только кладет апдейт в очередь, обработка идет в воркерах
+update_queue = UpdateQueue(feed_update, settings.bot_update_workers, settings.bot_update_queue_size)
+# Пользователи кешируются, last_message_id пишется в БД пачками
+user_cache = UserCache(settings.user_cache_size, settings.user_flush_interval)
+
 
 @dp.message(Command(commands=["start", "menu"]))
 async def start_handler(message: Message):
@@ -67,27 +72,8 @@ async def process_callback_button(callback_query: CallbackQuery):
 
 
 async def get_user_and_set_message_id(telegram_id, message_id):
-    async with get_session() as session:
-        user = await get_or_create_user(telegram_id, session)
-        user.last_message_id = message_id
-    return user
-
-async def get_or_create_user(telegram_id, session):
-    # Поиск пользователя по telegram_id
-    result = await session.execute(
-        select(User).where(User.telegram_id == telegram_id).fetch(1)
-    )
-    user = result.scalars().first()
-    
-    if user:
-        logging.info(f"Пользователь с telegram_id {telegram_id} найден: {user}")
-    else:
-        # Если пользователь не найден, создаем нового
-        user = User(telegram_id=telegram_id)
-        session.add(user)
-        await session.commit()
-        logging.info(f"Создан новый пользователь с telegram_id {telegram_id}")
-    
+    user = await user_cache.get(telegram_id)
+    user_cache.update(user, last_message_id=message_id)
     return user
 
 def repry_keyboard_markup():
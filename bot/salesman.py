@@ -1,6 +1,4 @@
-from transitions import Machine
 from transitions.extensions.asyncio import AsyncMachine
-import asyncio
 
 class Salesman(object):
     
@@ -30,7 +28,43 @@ class Salesman(object):
         { 'trigger': 'token_checked', 'source': 'checking_performance_token', 'dest': 'settings' },
     ]
     
-    def __init__(self, user):
+    __slots__ = ('user', 'state', 'user_cache')
+
+    def __init__(self, user, user_cache=None):
+        # Состояние берется из пользователя, машина общая для всех моделей
         self.user = user
-        state = self.user.current_state or 'waiting_start'
-        self.machine = AsyncMachine(model=self, states=Salesman.states, transitions=Salesman.transitions, initial=state)
\ No newline at end of file
+        self.user_cache = user_cache
+        self.state = self.user.current_state or 'waiting_start'
+
+    async def trigger(self, name, *args, **kwargs):
+        return await machine.events[name].trigger(self, *args, **kwargs)
+
+    def persist_state(self, *args, **kwargs):
+        # Новое состояние пишется в БД пачкой через кеш пользователей
+        if self.user_cache is not None:
+            self.user_cache.update(self.user, current_state=self.state)
+        else:
+            self.user.current_state = self.state
+
+
+# Одна машина на все модели: переходы компилируются один раз при импорте
+machine = AsyncMachine(
+    model=None,
+    states=Salesman.states,
+    transitions=Salesman.transitions,
+    initial='waiting_start',
+    after_state_change='persist_state',
+)
+
+
+def _event_trigger(name):
+    async def trigger(self, *args, **kwargs):
+        return await machine.events[name].trigger(self, *args, **kwargs)
+
+    trigger.__name__ = name
+    return trigger
+
+
+# Триггеры привязываются к классу, а не к каждому экземпляру
+for _name in machine.events:
+    setattr(Salesman, _name, _event_trigger(_name))
@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from transitions.extensions import GraphMachine
+
+from bot.salesman import Salesman
+
+
+def render_state_graph(state: str):
+    # Отрисовка через graphviz dot, выполняется в отдельном потоке
+    machine = GraphMachine(
+        states=Salesman.states, transitions=Salesman.transitions, initial=state
+    )
+    stream = BytesIO()
+    machine.get_graph().draw(stream, prog="dot", format="png")
+    return stream.getvalue()
+
+
+class StateGraphCache:
+    # Картинка графа Salesman в памяти и на диске. Ключ - хеш состояний,
+    # переходов и подсвеченного состояния, он же используется как ETag
+    def __init__(self, path: str = None):
+        self.path = path
+        self.images = {}
+        self._locks = {}
+
+    @staticmethod
+    def key(state: str):
+        graph = {
+            "states": Salesman.states,
+            "transitions": Salesman.transitions,
+            "state": state,
+        }
+        data = json.dumps(graph, sort_keys=True).encode()
+        return hashlib.sha256(data).hexdigest()
+
+    async def get(self, state: str = "waiting_start"):
+        key = self.key(state)
+        image = self.images.get(key)
+        if image is not None:
+            return key, image
+
+        # Один рендер на ключ при одновременных запросах
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            image = self.images.get(key)
+            if image is None:
+                image = await asyncio.to_thread(self._load_or_render, key, state)
+                self.images[key] = image
+
+        return key, image
+
+    def _file(self, key: str):
+        return os.path.join(self.path, f"{key}.png")
+
+    def _load_or_render(self, key: str, state: str):
+        if self.path and os.path.exists(self._file(key)):
+            with open(self._file(key), "rb") as f:
+                return f.read()
+
+        image = render_state_graph(state)
+
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_file = f"{self._file(key)}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(image)
+            os.replace(tmp_file, self._file(key))
+
+        return image
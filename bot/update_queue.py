@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+
+
+class UpdateQueue:
+    # Апдейты одного чата всегда попадают к одному воркеру,
+    # поэтому обрабатываются в порядке поступления
+    def __init__(self, handler, workers: int = 4, maxsize: int = 1000):
+        self.handler = handler
+        self.queues = [asyncio.Queue(maxsize) for _ in range(workers)]
+        self.workers = []
+        self.stats = {
+            "received": 0,
+            "processed": 0,
+            "failed": 0,
+            "backpressure": 0,
+            "max_depth": 0,
+            "handle_time": 0.0,
+        }
+
+    def start(self):
+        self.workers = [asyncio.create_task(self._work(queue)) for queue in self.queues]
+
+    @staticmethod
+    def chat_id(update: dict):
+        for key in ("message", "edited_message", "channel_post", "callback_query"):
+            event = update.get(key)
+            if not event:
+                continue
+            message = event.get("message", event) if key == "callback_query" else event
+            chat = message.get("chat") or event.get("from") or {}
+            if "id" in chat:
+                return chat["id"]
+
+        return update.get("update_id", 0)
+
+    def depth(self):
+        return sum(queue.qsize() for queue in self.queues)
+
+    async def put(self, update: dict):
+        queue = self.queues[hash(self.chat_id(update)) % len(self.queues)]
+        self.stats["received"] += 1
+
+        try:
+            queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Очередь переполнена: вебхук ждет места, Telegram притормаживает
+            self.stats["backpressure"] += 1
+            await queue.put(update)
+
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.depth())
+
+    async def _work(self, queue: asyncio.Queue):
+        while True:
+            update = await queue.get()
+            try:
+                if update is None:
+                    return
+
+                started_at = time.monotonic()
+                await self.handler(update)
+                self.stats["processed"] += 1
+                self.stats["handle_time"] += time.monotonic() - started_at
+            except Exception:
+                self.stats["failed"] += 1
+                logging.exception(f"Update {update.get('update_id')} failed")
+            finally:
+                queue.task_done()
+
+    async def drain(self, timeout: float = 30):
+        # Дообрабатываем принятые апдейты и останавливаем воркеров
+        for queue in self.queues:
+            await queue.put(None)
+
+        done, pending = await asyncio.wait(self.workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        if pending:
+            logging.warning(f"Update queue drain timeout, {self.depth()} dropped")
+
+        self.log_summary()
+
+    def log_summary(self):
+        stats = self.stats
+        logging.info(
+            f"Updates: {stats['received']} received, "
+            f"{stats['processed']} processed, {stats['failed']} failed, "
+            f"{stats['backpressure']} waited for queue space, "
+            f"max depth {stats['max_depth']}, "
+            f"{stats['handle_time']:.1f}s in handlers"
+        )
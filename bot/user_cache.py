@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from db.session import get_session
+from models.user import User
+
+
+class UserCache:
+    # Пользователи по telegram_id. Изменения last_message_id и current_state
+    # копятся в памяти и пишутся в БД пачкой раз в flush_interval секунд
+    WRITE_BEHIND_COLUMNS = {"last_message_id", "current_state"}
+
+    def __init__(self, maxsize: int = 10000, flush_interval: float = 5):
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.users = OrderedDict()
+        self.pending = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        self.stats = {"hits": 0, "misses": 0, "flushes": 0, "written": 0}
+
+    def start(self):
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.flush()
+        logging.info(f"User cache: {self.stats}")
+
+    async def get(self, telegram_id: int):
+        user = self.users.get(telegram_id)
+        if user is not None:
+            self.stats["hits"] += 1
+            self.users.move_to_end(telegram_id)
+            return user
+
+        self.stats["misses"] += 1
+        async with get_session() as session:
+            user = await get_or_create_user(telegram_id, session)
+
+        self.users[telegram_id] = user
+        if len(self.users) > self.maxsize:
+            self.users.popitem(last=False)
+
+        return user
+
+    def update(self, user: User, **values):
+        unknown = set(values) - self.WRITE_BEHIND_COLUMNS
+        if unknown:
+            raise ValueError(f"Columns {unknown} can not be written behind")
+
+        for name, value in values.items():
+            setattr(user, name, value)
+        self.pending.setdefault(user.id, {}).update(values)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logging.exception("User cache flush failed")
+
+    async def flush(self):
+        async with self._flush_lock:
+            pending, self.pending = self.pending, {}
+            if not pending:
+                return
+
+            # Один executemany UPDATE на каждый набор изменившихся колонок
+            groups = {}
+            for user_id, values in pending.items():
+                groups.setdefault(frozenset(values), []).append(
+                    {"b_id": user_id, **{f"b_{k}": v for k, v in values.items()}}
+                )
+
+            table = User.__table__
+            try:
+                async with get_session() as session:
+                    for columns, rows in groups.items():
+                        stmt = (
+                            update(table)
+                            .where(table.c.id == bindparam("b_id"))
+                            .values(
+                                updated_at=func.now(),
+                                **{name: bindparam(f"b_{name}") for name in columns},
+                            )
+                        )
+                        await session.execute(stmt, rows)
+            except Exception:
+                # Возвращаем изменения, не затирая более новые
+                for user_id, values in pending.items():
+                    self.pending[user_id] = {**values, **self.pending.get(user_id, {})}
+                raise
+
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(pending)
+
+
+async def get_or_create_user(telegram_id, session):
+    # Поиск пользователя по telegram_id
+    query = select(User).where(User.telegram_id == telegram_id)
+    result = await session.execute(query)
+    user = result.scalars().first()
+
+    if user:
+        logging.info(f"Пользователь с telegram_id {telegram_id} найден: {user}")
+        return user
+
+    # Уникальный индекс по telegram_id защищает от двойного создания
+    await session.execute(
+        pg_insert(User)
+        .values(telegram_id=telegram_id)
+        .on_conflict_do_nothing(index_elements=["telegram_id"])
+    )
+    result = await session.execute(query)
+    logging.info(f"Создан новый пользователь с telegram_id {telegram_id}")
+
+    return result.scalars().first()
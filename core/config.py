@@ -17,7 +17,31 @@ class Settings(BaseSettings):
     ozon_performance_client_id: Optional[str]
     ozon_performance_token: Optional[str]
     google_sheets_api_token: Optional[str]
+    google_service_account_file: str = "salesman-438218-a812bcd24486.json"
+    google_sheets_url: Optional[str] = None
+    # Таблицы для пакетной выгрузки: {ozon_seller_client_id: url}.
+    # Аккаунты без своей таблицы в Google Sheets не выгружаются
+    google_sheets_urls: dict[str, str] = {}
+    # Локальный архив отчетов: parquet, csv, xlsx через запятую
+    report_archive_dir: str = "reports"
+    report_sinks: Optional[str] = "parquet"
     timezone: str = "Europe/Moscow"
+    # Воркеры и размер очереди апдейтов вебхука
+    bot_update_workers: int = 4
+    bot_update_queue_size: int = 1000
+    user_cache_size: int = 10000
+    user_flush_interval: float = 5
+    state_graph_cache_dir: Optional[str] = "cache/state_graph"
+    ozon_statistics_cache_dir: Optional[str] = "cache/ozon_statistics"
+    ozon_statistics_fresh_days: int = 3
+    # Продажи из локальной копии отправлений (нужна миграция ozon_postings)
+    ozon_sales_from_db: bool = False
+    # auto - кампании из БД; если синхронизация устарела, список кампаний
+    # сначала загружается в БД (upload_campaigns), http - дневная статистика
+    ozon_campaigns_discovery: str = "auto"
+    # db - users.ozon_performance_session_token, file - JSON файл
+    ozon_performance_token_store: str = "db"
+    ozon_performance_token_file: str = "cache/ozon_performance_tokens.json"
 
     model_config = SettingsConfigDict(env_file="local.env", env_file_encoding="utf-8")
 
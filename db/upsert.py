@@ -0,0 +1,49 @@
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from utils.array import divide_chunks
+
+# Ограничение PostgreSQL на количество параметров в одном запросе
+MAX_BIND_PARAMS = 32767
+
+
+async def bulk_upsert(
+    session,
+    model,
+    rows: list,
+    index_elements: list,
+    update=True,
+    only_distinct=False,
+):
+    if not rows:
+        return
+
+    chunk_size = max(1, MAX_BIND_PARAMS // len(rows[0]))
+
+    for chunk in divide_chunks(rows, chunk_size):
+        stmt = pg_insert(model).values(chunk)
+
+        if update:
+            update_dict = {
+                c.name: c
+                for c in stmt.excluded
+                if c.name not in index_elements and c.name in chunk[0]
+            }
+            # Пропускаем UPDATE строк, в которых ничего не изменилось
+            where = None
+            if only_distinct:
+                columns = model.__table__.c
+                where = or_(
+                    *(
+                        columns[name].is_distinct_from(value)
+                        for name, value in update_dict.items()
+                    )
+                )
+
+            stmt = stmt.on_conflict_do_update(
+                index_elements=index_elements, set_=update_dict, where=where
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+        await session.execute(stmt)
@@ -1,4 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    Numeric,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+    true,
+)
 from sqlalchemy.orm import relationship
 from db.base import Base
 
@@ -8,6 +22,7 @@ class OzonCampaigns(Base):
 
     id = Column(Integer, primary_key=True)
     campaign_id = Column(Integer, unique=True, nullable=False)
+    client_id = Column(String(255))
     title = Column(String(255), nullable=False)
     state = Column(String(50))
     from_date = Column(DateTime)
@@ -20,6 +35,15 @@ class OzonCampaigns(Base):
         "OzonCampaignsProducts", back_populates="campaign", cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        Index(
+            "ix_ozon_campaigns_client_id_from_date",
+            "client_id",
+            "from_date",
+            postgresql_include=["campaign_id", "state", "to_date", "updated_at"],
+        ),
+    )
+
 
 class OzonCampaignsProducts(Base):
     __tablename__ = "ozon_campaigns_products"
@@ -38,3 +62,74 @@ class OzonCampaignsProducts(Base):
             "campaign_id", "product_id", name="unique_campaign_id_product_id"
         ),
     )
+
+
+class OzonPostings(Base):
+    __tablename__ = "ozon_postings"
+
+    id = Column(Integer, primary_key=True)
+    client_id = Column(String(255), nullable=False)
+    posting_number = Column(String(255), unique=True, nullable=False)
+    order_id = Column(BigInteger)
+    order_number = Column(String(255))
+    status = Column(String(50))
+    created_at = Column(DateTime)
+    in_process_at = Column(DateTime)
+    synced_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    products = relationship(
+        "OzonPostingsProducts", back_populates="posting", cascade="all, delete-orphan"
+    )
+
+    __table_args__ = (
+        Index("ix_ozon_postings_client_id_created_at", "client_id", "created_at"),
+    )
+
+
+class OzonPostingsProducts(Base):
+    __tablename__ = "ozon_postings_products"
+
+    id = Column(Integer, primary_key=True)
+    posting_number = Column(
+        String(255), ForeignKey("ozon_postings.posting_number"), nullable=False
+    )
+    sku = Column(BigInteger, nullable=False)
+    offer_id = Column(String(255))
+    name = Column(Text)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Numeric(12, 2))
+    currency_code = Column(String(10))
+
+    posting = relationship("OzonPostings", back_populates="products")
+
+    __table_args__ = (
+        UniqueConstraint("posting_number", "sku", name="unique_posting_number_sku"),
+    )
+
+
+class OzonSyncWatermarks(Base):
+    __tablename__ = "ozon_sync_watermarks"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False)
+    client_id = Column(String(255), nullable=False)
+    synced_from = Column(DateTime, nullable=False)
+    synced_to = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("name", "client_id", name="unique_sync_name_client_id"),
+    )
+
+
+class OzonProducts(Base):
+    __tablename__ = "ozon_products"
+
+    id = Column(Integer, primary_key=True)
+    sku = Column(BigInteger, unique=True, nullable=False)
+    client_id = Column(String(255), nullable=False)
+    name = Column(Text)
+    offer_id = Column(String(255))
+    price = Column(Numeric(12, 2))
+    # False - Ozon не вернул товар по этому SKU
+    found = Column(Boolean, nullable=False, server_default=true())
+    updated_at = Column(DateTime, nullable=False)
@@ -15,7 +15,7 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True)
-    telegram_id = Column(BigInteger, nullable=False)
+    telegram_id = Column(BigInteger, nullable=False, unique=True, index=True)
     telegram_name = Column(String(255), nullable=True)
     ozon_seller_token = Column(String(255), nullable=True)
     is_ozon_seller_token_valid = Column(Boolean, nullable=False, default=False)
@@ -2,7 +2,11 @@ import asyncio
 import logging
 from datetime import datetime
 
-from services.google import GoogleSheetsClient
+from core.config import settings
+from services.google_exporter import GoogleSheetsExporter
+from services.http_pool import close_connectors
+from services.report_sinks import GoogleSheetsSink, build_report_sinks
+from utils.rate_limiter import request_metrics
 from services.ozon.drr_report import OzonDRRReport
 
 logging.basicConfig(
@@ -17,17 +21,20 @@ to = datetime.strptime("2024-11-12", "%Y-%m-%d").date()
 
 
 async def main():
-    report = OzonDRRReport(since, to)
-    df = await report.process()
+    sinks = build_report_sinks(settings.report_sinks, settings.report_archive_dir)
+    if settings.google_sheets_url:
+        exporter = GoogleSheetsExporter(settings.google_service_account_file)
+        sinks.append(GoogleSheetsSink(exporter, settings.google_sheets_url))
 
-    gsheet_client = GoogleSheetsClient(
-        "salesman-438218-a812bcd24486.json",
-        "https://docs.google.com/spreadsheets/d/1rsCAm-uUqovLlhr3HNS-jsTA0qvDEYSWSaBmP6_LB44/edit",
-    )
+    try:
+        report = OzonDRRReport(since, to)
+        await report.process(sinks=sinks)
 
-    gsheet_client.append_drr_report(df, since, to)
+        del report
 
-    del report
+        request_metrics.log_summary()
+    finally:
+        await close_connectors()
 
     # # Загрузка DataFrame из CSV файла
     # csv_file_path = f"report_report_{since}_{to}.csv"
@@ -1,23 +1,28 @@
 import re
 from datetime import date, datetime
+from functools import lru_cache
 
 import gspread
 import pandas as pd
 from google.oauth2.service_account import Credentials
+from gspread.utils import absolute_range_name
 from gspread_formatting import (
     Border,
     Borders,
     CellFormat,
     Color,
     TextFormat,
-    format_cell_range,
-    set_column_width,
 )
 
+from services.google_batch import SheetsBatchRequest
+from services.google_metadata import metadata_cache
+
 
 class GoogleSheetsClient:
 
     SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
+    NEW_WORKSHEET_ROWS = 200
+    NEW_WORKSHEET_COLS = 20
     MONTHS = {
         "January": "Январь",
         "February": "Февраль",
@@ -33,9 +38,10 @@ class GoogleSheetsClient:
         "December": "Декабрь",
     }
 
-    def __init__(self, service_account_file_path, gsheet_url):
+    def __init__(self, service_account_file_path, gsheet_url, metadata=None):
         self.account_file_path = service_account_file_path
         self.gsheet_key = self.extract_gsheet_key(gsheet_url)
+        self.metadata = metadata or metadata_cache
 
     def extract_gsheet_key(self, gsheet_url):
         match = re.search(r"/d/([a-zA-Z0-9-_]+)", gsheet_url)
@@ -45,24 +51,66 @@ class GoogleSheetsClient:
         return match.group(1)
 
     def authorize(self):
-        credentials = Credentials.from_service_account_file(
-            self.account_file_path, scopes=self.SCOPES
-        )
-        self.gc = gspread.authorize(credentials)
+        self.gc = get_gspread_client(self.account_file_path)
 
     def append_drr_report(self, df: pd.DataFrame, since, to):
         self.authorize()
+        http_client = self.gc.http_client
 
-        self.sh = self.gc.open_by_key(self.gsheet_key)
         df = self.prepare_drr_data_frame(df, since, to)
+        name = self.extract_mont_name(self.to_datetime(since))
+
+        sheet_id = self.metadata.sheets(http_client, self.gsheet_key).get(name)
+        is_new_worksheet = sheet_id is None
+        if is_new_worksheet:
+            sheet_id = self.metadata.new_id()
+            sheet = {
+                "row_count": self.NEW_WORKSHEET_ROWS,
+                "next_row": 3,
+                "cursor_id": None,
+            }
+        else:
+            # Курсор не кешируется: таблицу могли дописать другие процессы
+            try:
+                sheet = self.metadata.cursor(http_client, self.gsheet_key, name)
+            except Exception:
+                self.metadata.invalidate(self.gsheet_key)
+                raise
+
+        # Все изменения листа уходят одним batchUpdate и одной записью значений
+        batch = SheetsBatchRequest(sheet_id, name)
+        if is_new_worksheet:
+            batch.add_sheet(self.NEW_WORKSHEET_ROWS, self.NEW_WORKSHEET_COLS)
+            self.format_drr_worksheet(batch)
+
+        next_row = sheet["next_row"]
+        if next_row is None:
+            next_row = self.find_next_row(http_client, name)
 
-        is_new_worksheet = self.set_worksheet(
-            self.extract_mont_name(self.to_datetime(since))
+        last_row_index = self.insert_report(df, batch, next_row, sheet["row_count"])
+
+        # Курсор следующей строки обновляется тем же batchUpdate
+        cursor_exists = sheet["cursor_id"] is not None
+        cursor_id = sheet["cursor_id"] or self.metadata.new_id()
+        batch.set_metadata(
+            self.metadata.NEXT_ROW_KEY, last_row_index + 3, cursor_id, cursor_exists
         )
+
+        try:
+            batch.execute(http_client, self.gsheet_key)
+        except Exception:
+            self.metadata.invalidate(self.gsheet_key)
+            raise
+
         if is_new_worksheet:
-            self.format_drr_worksheet()
+            self.metadata.add(self.gsheet_key, name, sheet_id)
 
-        self.insert_report(df)
+    def find_next_row(self, http_client, title: str):
+        # Лист без курсора: считаем заполненные строки колонки C
+        response = http_client.values_get(
+            self.gsheet_key, absolute_range_name(title, "C:C")
+        )
+        return len(response.get("values", [])) + 3
 
     def prepare_drr_data_frame(self, df: pd.DataFrame, since, to):
         df.rename(
@@ -106,47 +154,23 @@ class GoogleSheetsClient:
         month_name = d.strftime("%B")
         return f"{self.MONTHS[month_name]} {d.year}"
 
-    def set_worksheet(self, name):
-        try:
-            self.worksheet = self.sh.worksheet(name)
-            return False
-        except gspread.exceptions.WorksheetNotFound:
-            self.worksheet = self.sh.add_worksheet(title=name, rows="200", cols="20")
-            return True
-
-    def format_drr_worksheet(self):
-        # Скрыть определенные столбцы (например, столбцы B и D)
-        requests = [
-            {
-                "updateDimensionProperties": {
-                    "range": {
-                        "sheetId": self.worksheet._properties["sheetId"],
-                        "dimension": "COLUMNS",
-                        "startIndex": 8,  # Индекс столбца для столбца D
-                        "endIndex": 13,
-                    },
-                    "properties": {"hiddenByUser": True},
-                    "fields": "hiddenByUser",
-                }
-            },
-        ]
-
-        self.sh.batch_update({"requests": requests})
+    def format_drr_worksheet(self, batch: SheetsBatchRequest):
+        # Скрыть столбцы I:M
+        batch.hide_columns("I:M")
 
         # Установка ширины для определенных столбцов
         column_widths = {"C": 300, "D": 125, "G": 145}
 
         for col_letter, width in column_widths.items():
-            set_column_width(self.worksheet, col_letter, width)
-
-    def insert_report(self, df: pd.DataFrame):
-        cell_list = self.worksheet.col_values(3)
-        next_row = len(cell_list) + 3
+            batch.column_width(col_letter, width)
 
+    def insert_report(
+        self, df: pd.DataFrame, batch: SheetsBatchRequest, next_row: int, row_count
+    ):
         # Проверка лимита строк и расширение, если необходимо
         required_rows = next_row + len(df) + 1
-        if required_rows > self.worksheet.row_count:
-            self.worksheet.add_rows(required_rows - self.worksheet.row_count)
+        if required_rows > row_count:
+            batch.append_rows(required_rows - row_count)
 
         # Вставка заголовков и значений из DataFrame в Google Sheets
         data_headers = [df.columns.values.tolist()]
@@ -154,33 +178,24 @@ class GoogleSheetsClient:
         all_data = data_headers + data_values
 
         # Вставка всех строк данных за один раз
-        self.worksheet.append_rows(
-            all_data, value_input_option="RAW", table_range=f"B{next_row}"
-        )
+        last_row_index = next_row + len(all_data) - 1
+        last_column = chr(65 + len(df.columns))
+        batch.values(f"B{next_row}:{last_column}{last_row_index}", all_data)
 
         # Форматирование последней вставленной строки
-        last_row_index = next_row + len(all_data) - 1
         cell_format = CellFormat(
             textFormat=TextFormat(
                 fontSize=14,
                 foregroundColor=Color(0, 0.69, 0.313),
             ),
         )
-        format_cell_range(
-            self.worksheet,
-            f"C{last_row_index}:C{last_row_index}",
-            cell_format,
-        )
-        format_cell_range(
-            self.worksheet,
-            f"F{last_row_index}:G{last_row_index}",
-            cell_format,
-        )
+        batch.format(f"C{last_row_index}:C{last_row_index}", cell_format)
+        batch.format(f"F{last_row_index}:G{last_row_index}", cell_format)
 
-        self.worksheet.merge_cells(f"B{next_row + 1}:B{last_row_index}")
+        batch.merge(f"B{next_row + 1}:B{last_row_index}")
 
         cell_format = CellFormat(verticalAlignment="MIDDLE")
-        format_cell_range(self.worksheet, f"B{next_row + 1}", cell_format)
+        batch.format(f"B{next_row + 1}", cell_format)
 
         # Создаем формат ячеек с черными границами
         cell_format = CellFormat(
@@ -195,11 +210,7 @@ class GoogleSheetsClient:
         )
 
         # Применяем формат ко всему диапазону вставленных данных
-        format_cell_range(
-            self.worksheet,
-            f"B{next_row}:{chr(65 + len(df.columns))}{last_row_index}",
-            cell_format,
-        )
+        batch.format(f"B{next_row}:{last_column}{last_row_index}", cell_format)
 
         # Форматирование ячеек по типам данных
         column_formats = {
@@ -215,8 +226,18 @@ class GoogleSheetsClient:
                     df.columns.get_loc(col_name) + 1
                 )  # Получаем индекс колонки (начинается с 0)
 
-                format_cell_range(
-                    self.worksheet,
+                batch.format(
                     f"{chr(65 + col_index)}{next_row}:{chr(65 + col_index)}{last_row_index}",
                     col_format,
                 )
+
+        return last_row_index
+
+
+@lru_cache
+def get_gspread_client(service_account_file_path):
+    # Ключ сервисного аккаунта читается один раз, токен обновляет google-auth
+    credentials = Credentials.from_service_account_file(
+        service_account_file_path, scopes=GoogleSheetsClient.SCOPES
+    )
+    return gspread.authorize(credentials)
@@ -0,0 +1,140 @@
+from gspread.utils import (
+    a1_range_to_grid_range,
+    absolute_range_name,
+    column_letter_to_index,
+)
+from gspread_formatting import CellFormat
+
+
+class SheetsBatchRequest:
+    # Изменения одного листа копятся и отправляются двумя вызовами API:
+    # spreadsheets.batchUpdate (строки, форматы, объединения, ширины)
+    # и spreadsheets.values.batchUpdate (значения)
+    def __init__(self, sheet_id: int, title: str):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.requests = []
+        self.data = []
+
+    def grid_range(self, name: str):
+        return a1_range_to_grid_range(name, self.sheet_id)
+
+    def columns_range(self, label: str):
+        start, _, end = label.partition(":")
+        return {
+            "sheetId": self.sheet_id,
+            "dimension": "COLUMNS",
+            "startIndex": column_letter_to_index(start) - 1,
+            "endIndex": column_letter_to_index(end or start),
+        }
+
+    def add_sheet(self, rows: int, cols: int):
+        self.requests.append(
+            {
+                "addSheet": {
+                    "properties": {
+                        "sheetId": self.sheet_id,
+                        "title": self.title,
+                        "gridProperties": {"rowCount": rows, "columnCount": cols},
+                    }
+                }
+            }
+        )
+
+    def append_rows(self, count: int):
+        self.requests.append(
+            {
+                "appendDimension": {
+                    "sheetId": self.sheet_id,
+                    "dimension": "ROWS",
+                    "length": count,
+                }
+            }
+        )
+
+    def format(self, name: str, cell_format: CellFormat):
+        self.requests.append(
+            {
+                "repeatCell": {
+                    "range": self.grid_range(name),
+                    "cell": {"userEnteredFormat": cell_format.to_props()},
+                    "fields": ",".join(
+                        cell_format.affected_fields("userEnteredFormat")
+                    ),
+                }
+            }
+        )
+
+    def merge(self, name: str, merge_type="MERGE_ALL"):
+        self.requests.append(
+            {"mergeCells": {"range": self.grid_range(name), "mergeType": merge_type}}
+        )
+
+    def column_width(self, label: str, width: int):
+        self.requests.append(
+            {
+                "updateDimensionProperties": {
+                    "range": self.columns_range(label),
+                    "properties": {"pixelSize": width},
+                    "fields": "pixelSize",
+                }
+            }
+        )
+
+    def hide_columns(self, label: str):
+        self.requests.append(
+            {
+                "updateDimensionProperties": {
+                    "range": self.columns_range(label),
+                    "properties": {"hiddenByUser": True},
+                    "fields": "hiddenByUser",
+                }
+            }
+        )
+
+    def set_metadata(self, key: str, value, metadata_id: int, exists: bool):
+        if exists:
+            self.requests.append(
+                {
+                    "updateDeveloperMetadata": {
+                        "dataFilters": [
+                            {"developerMetadataLookup": {"metadataId": metadata_id}}
+                        ],
+                        "developerMetadata": {"metadataValue": str(value)},
+                        "fields": "metadataValue",
+                    }
+                }
+            )
+            return
+
+        self.requests.append(
+            {
+                "createDeveloperMetadata": {
+                    "developerMetadata": {
+                        "metadataId": metadata_id,
+                        "metadataKey": key,
+                        "metadataValue": str(value),
+                        "location": {"sheetId": self.sheet_id},
+                        "visibility": "DOCUMENT",
+                    }
+                }
+            }
+        )
+
+    def values(self, name: str, values: list):
+        self.data.append(
+            {"range": absolute_range_name(self.title, name), "values": values}
+        )
+
+    def execute(self, http_client, spreadsheet_id: str, value_input_option="RAW"):
+        # Сначала структура листа, чтобы новые строки уже существовали
+        if self.requests:
+            http_client.batch_update(spreadsheet_id, {"requests": self.requests})
+        if self.data:
+            http_client.values_batch_update(
+                spreadsheet_id,
+                {"valueInputOption": value_input_option, "data": self.data},
+            )
+
+        self.requests = []
+        self.data = []
@@ -0,0 +1,25 @@
+import asyncio
+import logging
+
+import pandas as pd
+
+from services.google import GoogleSheetsClient
+
+
+class GoogleSheetsExporter:
+    # gspread синхронный, поэтому выгрузка идет в потоках и не блокирует
+    # event loop. В одну таблицу одновременно пишет только один поток:
+    # лист и следующая строка определяются по ее текущему содержимому
+    def __init__(self, service_account_file_path: str, max_concurrency: int = 4):
+        self.account_file_path = service_account_file_path
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self._locks = {}
+
+    async def append_drr_report(self, gsheet_url: str, df: pd.DataFrame, since, to):
+        client = GoogleSheetsClient(self.account_file_path, gsheet_url)
+        lock = self._locks.setdefault(client.gsheet_key, asyncio.Lock())
+
+        async with lock, self.semaphore:
+            await asyncio.to_thread(client.append_drr_report, df.copy(), since, to)
+
+        logging.info(f"DRR report since {since} to {to} exported to {gsheet_url}")
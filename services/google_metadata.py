@@ -0,0 +1,84 @@
+import random
+import threading
+import time
+
+from gspread.utils import absolute_range_name
+
+
+class SpreadsheetMetadataCache:
+    # Кешируются только sheet_id листов таблицы. Курсор следующей свободной
+    # строки (developer metadata листа) и размер листа перечитываются перед
+    # каждой записью: в таблицу могут писать и другие процессы
+    NEXT_ROW_KEY = "drr_next_row"
+    FIELDS = "sheets(properties(sheetId,title))"
+    CURSOR_FIELDS = (
+        "sheets(properties(gridProperties(rowCount)),"
+        "developerMetadata(metadataId,metadataKey,metadataValue))"
+    )
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.spreadsheets = {}
+        # Выгрузка идет из потоков
+        self._lock = threading.Lock()
+
+    def sheets(self, http_client, spreadsheet_id: str):
+        with self._lock:
+            cached = self.spreadsheets.get(spreadsheet_id)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+
+        # Один запрос метаданных без данных ячеек
+        metadata = http_client.fetch_sheet_metadata(
+            spreadsheet_id, params={"fields": self.FIELDS}
+        )
+        sheets = {
+            sheet["properties"]["title"]: sheet["properties"]["sheetId"]
+            for sheet in metadata.get("sheets", [])
+        }
+
+        with self._lock:
+            self.spreadsheets[spreadsheet_id] = (time.monotonic(), sheets)
+
+        return sheets
+
+    def cursor(self, http_client, spreadsheet_id: str, title: str):
+        # Только один лист и только нужные поля
+        metadata = http_client.fetch_sheet_metadata(
+            spreadsheet_id,
+            params={"fields": self.CURSOR_FIELDS, "ranges": absolute_range_name(title)},
+        )
+        sheet = metadata["sheets"][0]
+        cursor = next(
+            (
+                item
+                for item in sheet.get("developerMetadata", [])
+                if item.get("metadataKey") == self.NEXT_ROW_KEY
+            ),
+            None,
+        )
+
+        return {
+            "row_count": sheet["properties"]["gridProperties"]["rowCount"],
+            "next_row": int(cursor["metadataValue"]) if cursor else None,
+            "cursor_id": cursor["metadataId"] if cursor else None,
+        }
+
+    def add(self, spreadsheet_id: str, title: str, sheet_id: int):
+        with self._lock:
+            cached = self.spreadsheets.get(spreadsheet_id)
+            if cached is not None:
+                cached[1][title] = sheet_id
+
+    def invalidate(self, spreadsheet_id: str):
+        with self._lock:
+            self.spreadsheets.pop(spreadsheet_id, None)
+
+    @staticmethod
+    def new_id():
+        # sheetId и metadataId задаем сами, чтобы ссылаться на них
+        # в том же batchUpdate
+        return random.randrange(1, 2**31 - 1)
+
+
+metadata_cache = SpreadsheetMetadataCache()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import ssl
+from functools import lru_cache
+
+import aiohttp
+import certifi
+from yarl import URL
+
+from utils.rate_limiter import rate_limiters, request_metrics
+
+# Общие на весь процесс пулы соединений: один TCPConnector на хост API,
+# чтобы keep-alive соединения и TLS-сессии переиспользовались между
+# клиентами, пользователями и запусками отчетов
+CONNECTIONS_LIMIT_PER_HOST = 20
+KEEPALIVE_TIMEOUT = 60
+DNS_CACHE_TTL = 300
+
+_connectors = {}
+
+
+@lru_cache(maxsize=None)
+def get_ssl_context():
+    return ssl.create_default_context(cafile=certifi.where())
+
+
+def get_connector(host: str):
+    loop = asyncio.get_running_loop()
+
+    for key in [key for key in _connectors if key[0].is_closed()]:
+        del _connectors[key]
+
+    connector = _connectors.get((loop, host))
+    if connector is None or connector.closed:
+        connector = aiohttp.TCPConnector(
+            ssl=get_ssl_context(),
+            limit_per_host=CONNECTIONS_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        _connectors[(loop, host)] = connector
+
+    return connector
+
+
+async def close_connectors():
+    loop = asyncio.get_running_loop()
+
+    for key in [key for key in _connectors if key[0] is loop]:
+        await _connectors.pop(key).close()
+
+
+class RateLimitedClientSession(aiohttp.ClientSession):
+    # Сколько раз повторяем запрос после 429 Too Many Requests
+    MAX_THROTTLE_RETRIES = 3
+    DEFAULT_RETRY_AFTER = 1
+
+    async def _request(self, method, url, **kwargs):
+        request_url = URL(str(url))
+        if not request_url.is_absolute():
+            request_url = self._base_url.join(request_url)
+        limiters = rate_limiters.get(request_url.host, request_url.path)
+
+        loop = asyncio.get_running_loop()
+        retries = 0
+        while True:
+            started_at = loop.time()
+            for limiter in limiters:
+                await limiter.acquire()
+            sent_at = loop.time()
+
+            response = await super()._request(method, url, **kwargs)
+
+            throttled = response.status == 429
+            request_metrics.record(
+                request_url.host, sent_at - started_at, loop.time() - sent_at, throttled
+            )
+            if not throttled or retries >= self.MAX_THROTTLE_RETRIES:
+                return response
+
+            retry_after = self._retry_after(response)
+            logging.info(f"{request_url} throttled, retry after {retry_after}s")
+            for limiter in limiters:
+                limiter.pause(retry_after)
+
+            response.release()
+            retries += 1
+
+    def _retry_after(self, response):
+        try:
+            return float(response.headers.get("Retry-After", self.DEFAULT_RETRY_AFTER))
+        except ValueError:
+            return self.DEFAULT_RETRY_AFTER
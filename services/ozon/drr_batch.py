@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from sqlalchemy import select
+
+from db.session import get_session
+from models.user import User
+from services.ozon.drr_report import OzonDRRReport
+from services.ozon.performance_client import OzonPerformanceClient
+from services.ozon.seller import OzonSellerClient
+from utils.rate_limiter import request_metrics
+
+
+class OzonDRRBatchRunner:
+    # Сколько аккаунтов одновременно обращаются к одному хосту API
+    HOST_CONCURRENCY = {
+        OzonSellerClient.BASE_URL.host: 4,
+        OzonPerformanceClient.BASE_URL.host: 4,
+    }
+
+    def __init__(self, since: date, to: date, max_workers: int = None, export=None):
+        self.since = since
+        self.to = to
+        self.max_workers = max_workers
+        # async export(user, report) - выгрузка готового отчета, идет
+        # параллельно с загрузкой отчетов других аккаунтов
+        self.export = export
+        self.results = {}
+        self.errors = {}
+        self.durations = {}
+
+    async def get_users(self):
+        async with get_session() as session:
+            result = await session.execute(
+                select(User).where(
+                    User.deleted.is_(False),
+                    User.is_ozon_seller_token_valid.is_(True),
+                    User.is_performance_token_valid.is_(True),
+                    User.ozon_seller_client_id.isnot(None),
+                    User.ozon_seller_token.isnot(None),
+                    User.ozon_performance_client_id.isnot(None),
+                    User.ozon_performance_token.isnot(None),
+                )
+            )
+            return result.scalars().all()
+
+    async def run_user(self, user: User, executor, host_limits: dict):
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+
+        report = OzonDRRReport(
+            self.since,
+            self.to,
+            seller_client_id=user.ozon_seller_client_id,
+            seller_token=user.ozon_seller_token,
+            performance_client_id=user.ozon_performance_client_id,
+            performance_token=user.ozon_performance_token,
+            host_limits=host_limits,
+        )
+
+        try:
+            result = await report.process(executor)
+            logging.info(f"DRR report for user {user.id} is ready")
+
+            # Отчет, который не удалось выгрузить, считается неуспешным
+            if self.export is not None:
+                await self.export(user, result)
+            self.results[user.id] = result
+        except Exception as e:
+            self.errors[user.id] = e
+            logging.exception(f"DRR report for user {user.id} failed")
+        finally:
+            self.durations[user.id] = loop.time() - started_at
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+
+        users = await self.get_users()
+        logging.info(
+            f"DRR batch for {len(users)} users since {self.since} to {self.to}"
+        )
+
+        host_limits = {
+            host: asyncio.Semaphore(limit)
+            for host, limit in self.HOST_CONCURRENCY.items()
+        }
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            await asyncio.gather(
+                *(self.run_user(user, executor, host_limits) for user in users)
+            )
+
+        self.log_summary(len(users), loop.time() - started_at)
+
+        return self.results
+
+    def log_summary(self, total: int, elapsed: float):
+        rows = sum(len(report) for report in self.results.values())
+        durations = list(self.durations.values())
+        average = sum(durations) / len(durations) if durations else 0
+        throughput = len(self.results) / elapsed * 60 if elapsed else 0
+
+        logging.info(
+            f"DRR batch finished in {elapsed:.1f}s: "
+            f"{len(self.results)}/{total} reports, {len(self.errors)} failed, "
+            f"{rows} rows, {average:.1f}s per account, "
+            f"{throughput:.1f} reports/min"
+        )
+        request_metrics.log_summary()
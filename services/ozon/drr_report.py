@@ -5,71 +5,120 @@ import numpy as np
 import pandas as pd
 
 from core.config import settings
-from services.ozon.performance_client import OzonPerformanceClient
+from services.ozon.performance_client import (
+    OzonPerformanceClient,
+    aggregate_statistics,
+)
+from services.ozon.performance.token_store import get_token_store
+from services.ozon.schemas import PRODUCT_INFO_SCHEMA
 from services.ozon.seller import OzonSellerClient
+from services.report_sinks import write_report_sinks
+from utils.arrow import records_to_pandas
 
 
 class OzonDRRReport:
-    def __init__(self, since: date, to: date):
+    def __init__(
+        self,
+        since: date,
+        to: date,
+        seller_client_id: str = None,
+        seller_token: str = None,
+        performance_client_id: str = None,
+        performance_token: str = None,
+        host_limits: dict = None,
+    ):
         self.since = since
         self.to = to
-
-    async def get_report_dataframe(self):
+        self.seller_client_id = seller_client_id or settings.ozon_seller_client_id
+        self.seller_token = seller_token or settings.ozon_seller_token
+        self.performance_client_id = (
+            performance_client_id or settings.ozon_performance_client_id
+        )
+        self.performance_token = performance_token or settings.ozon_performance_token
+        # Семафоры по хосту API, общие для всех отчетов пакетного запуска
+        self.host_limits = host_limits or {}
+
+    async def _limited(self, client, coro):
+        semaphore = self.host_limits.get(client.BASE_URL.host)
+        if semaphore is None:
+            return await coro
+
+        async with semaphore:
+            return await coro
+
+    async def fetch(self):
         async with OzonSellerClient(
-            client_id=settings.ozon_seller_client_id,
-            token=settings.ozon_seller_token,
+            client_id=self.seller_client_id,
+            token=self.seller_token,
             timezone=settings.timezone,
         ) as seller_client, OzonPerformanceClient(
-            client_id=settings.ozon_performance_client_id,
-            token=settings.ozon_performance_token,
+            client_id=self.performance_client_id,
+            token=self.performance_token,
             timezone=settings.timezone,
+            statistics_cache_dir=settings.ozon_statistics_cache_dir,
+            statistics_fresh_days=settings.ozon_statistics_fresh_days,
+            campaigns_discovery=settings.ozon_campaigns_discovery,
+            token_store=get_token_store(
+                settings.ozon_performance_token_store,
+                settings.ozon_performance_token_file,
+            ),
         ) as performence_client:
 
-            results = await asyncio.gather(
-                seller_client.selled_products_statistics(self.since, self.to),
-                performence_client.get_statistics(self.since, self.to),
+            if settings.ozon_sales_from_db:
+                sales = seller_client.synced_products_statistics(self.since, self.to)
+            else:
+                sales = seller_client.selled_products_statistics(self.since, self.to)
+
+            sales, statistics = await asyncio.gather(
+                self._limited(seller_client, sales),
+                self._limited(
+                    performence_client,
+                    performence_client.get_statistics_report(self.since, self.to),
+                ),
             )
 
-            sales = results[0]
-            performance = results[1]
-
-            performance = performance.drop(columns=["price"])
-            report = pd.merge(
-                sales,
-                performance,
-                on="sku",
-                how="outer",
+            # SKU с рекламой, но без продаж, не имеют offer_id
+            missed_skus = []
+            if not statistics.empty:
+                missed_skus = [
+                    int(sku)
+                    for sku in statistics["sku"].unique()
+                    if sku not in sales.index
+                ]
+            products = await self._limited(
+                seller_client, self.get_missed_products(missed_skus, seller_client)
             )
 
-            del sales
-            del performance
+            return sales, statistics, products
 
-            report = await self.fill_missed_data(report, seller_client)
+    async def get_report_dataframe(self):
+        sales, statistics, products = await self.fetch()
 
-            return report
+        return build_report_dataframe(sales, statistics, products)
 
-    async def fill_missed_data(self, report, seller_client):
-        sku_without_offer_id = list(report[report["offer_id"].isna()].index)
-        if sku_without_offer_id:
-            products = await seller_client.get_pruducts_by_sku(sku_without_offer_id)
+    async def get_missed_products(self, skus: list, seller_client):
+        if not skus:
+            return None
 
-            products = pd.DataFrame(
-                products, columns=["sku", "name", "offer_id", "price"]
-            )
-            products.set_index("sku", inplace=True)
+        products = await seller_client.get_products_by_sku_cached(skus)
 
-            products["price"] = products["price"].astype("float")
+        products = records_to_pandas(products, PRODUCT_INFO_SCHEMA)
+        products.set_index("sku", inplace=True)
 
-            report = report.fillna(products)
+        return products
 
-            del products
+    @staticmethod
+    def fill_missed_data(report, products):
+        if products is not None:
+            report = report.fillna(products)
 
         report["currency_code"] = report["currency_code"].fillna("RUB")
         report = report.fillna(0)
 
         return report
 
-    def prepare_data(self, report):
+    @staticmethod
+    def prepare_data(report):
 
         report = report.drop(columns=["name", "currency_code", "campaign_id"])
         report = report.sort_values(by="offer_id")
@@ -94,7 +143,8 @@ class OzonDRRReport:
 
         return report
 
-    def generate_total(self, report):
+    @staticmethod
+    def generate_total(report):
         total_profit = report["profit"].sum()
         total_spent = report["moneySpent"].sum()
 
@@ -107,13 +157,47 @@ class OzonDRRReport:
             "drr": total_spent / total_profit,
         }
 
-    async def process(self):
-        report: pd.DataFrame = await self.get_report_dataframe()
-        report = self.prepare_data(report)
-        report.loc[""] = self.generate_total(report)
+    async def process(self, executor=None, sinks=None):
+        sales, statistics, products = await self.fetch()
+
+        # Агрегацию pandas можно вынести в пул процессов
+        if executor is None:
+            report = build_drr_report(sales, statistics, products)
+        else:
+            loop = asyncio.get_running_loop()
+            report = await loop.run_in_executor(
+                executor, build_drr_report, sales, statistics, products
+            )
 
-        # report.to_excel(f"report_report_{self.since}_{self.to}.xlsx", index=True)
-        # report.to_csv(f"report_report_{self.since}_{self.to}.csv", index=True)
-        # report.to_json(f"report_report_{self.since}_{self.to}.json", index=True)
+        # Parquet/CSV/XLSX/Google Sheets из одного посчитанного отчета
+        if sinks:
+            await write_report_sinks(
+                sinks, report, self.seller_client_id, self.since, self.to
+            )
 
         return report
+
+
+def build_report_dataframe(sales, statistics, products):
+    performance = aggregate_statistics(statistics)
+
+    performance = performance.drop(columns=["price"])
+    report = pd.merge(
+        sales,
+        performance,
+        on="sku",
+        how="outer",
+    )
+
+    del sales
+    del performance
+
+    return OzonDRRReport.fill_missed_data(report, products)
+
+
+def build_drr_report(sales, statistics, products):
+    report = build_report_dataframe(sales, statistics, products)
+    report = OzonDRRReport.prepare_data(report)
+    report.loc[""] = OzonDRRReport.generate_total(report)
+
+    return report
@@ -1,19 +1,21 @@
+import asyncio
 import logging
+from datetime import datetime
 
 import inflection
 import numpy as np
 import pandas as pd
-from sqlalchemy import select
-from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import Integer, all_, bindparam, delete, select
+from sqlalchemy.dialects.postgresql import ARRAY
 from yarl import URL
 
 from db.session import get_session
-from models.ozon import OzonCampaigns, OzonCampaignsProducts
-import certifi
-import ssl
+from db.upsert import bulk_upsert
+from models.ozon import OzonCampaigns, OzonCampaignsProducts, OzonSyncWatermarks
 
 
 class OzonPerformanceCampaignsMixin:
+    CAMPAIGNS_WATERMARK = "performance_campaigns"
 
     def _fix_time(self, column):
         return pd.to_datetime(column).dt.tz_localize(None)
@@ -31,69 +33,146 @@ class OzonPerformanceCampaignsMixin:
         campaigns["updated_at"] = self._fix_time(campaigns["updated_at"])
         campaigns["from_date"] = self._fix_time(campaigns["from_date"])
         campaigns["to_date"] = self._fix_time(campaigns["to_date"])
-        campaigns = campaigns.replace({np.nan: None})
+        campaigns["client_id"] = self.client_id
 
         async with get_session() as session:
-            # Преобразуем DataFrame в список словарей
-            data_to_insert = campaigns.to_dict(orient="records")
+            # Кампании без client_id считаются новыми и перезаписываются
+            result = await session.execute(
+                select(OzonCampaigns.campaign_id, OzonCampaigns.updated_at).where(
+                    OzonCampaigns.client_id == self.client_id
+                )
+            )
+            stored_updated_at = dict(result.all())
 
-            # Создаем запрос на вставку с обновлением
-            stmt = pg_insert(OzonCampaigns).values(data_to_insert)
-            update_dict = {c.name: c for c in stmt.excluded}
+        # Записываем только новые кампании и кампании с изменившимся updatedAt
+        changed = campaigns[
+            pd.to_datetime(campaigns["campaign_id"].map(stored_updated_at))
+            != campaigns["updated_at"]
+        ]
+        changed = changed.replace({np.nan: None})
 
-            # Используем ON CONFLICT для обновления в случае совпадения уникального ключа
-            stmt = stmt.on_conflict_do_update(
-                index_elements=["campaign_id"], set_=update_dict
+        async with get_session() as session:
+            # Преобразуем DataFrame в список словарей
+            data_to_insert = changed.to_dict(orient="records")
+
+            # ON CONFLICT обновляет строку, только если значения отличаются
+            await bulk_upsert(
+                session,
+                OzonCampaigns,
+                data_to_insert,
+                ["campaign_id"],
+                only_distinct=True,
+            )
+            # Отметка для поиска кампаний статистики по БД
+            synced_at = datetime.now()
+            await bulk_upsert(
+                session,
+                OzonSyncWatermarks,
+                [
+                    {
+                        "name": self.CAMPAIGNS_WATERMARK,
+                        "client_id": self.client_id,
+                        "synced_from": synced_at,
+                        "synced_to": synced_at,
+                    }
+                ],
+                ["name", "client_id"],
             )
 
-            await session.execute(stmt)
+        self.changed_campaign_ids = list(changed["campaign_id"])
+        self.campaigns_sync_stats = {
+            "fetched": len(campaigns),
+            "changed": len(changed),
+            "unchanged": len(campaigns) - len(changed),
+        }
+        logging.info(f"Campaigns synced: {self.campaigns_sync_stats}")
 
         return campaigns
 
-    async def upload_campaigns_products(self, state=None):
+    async def get_campaigns_synced_at(self):
         async with get_session() as session:
-            query = select(OzonCampaigns)
+            result = await session.execute(
+                select(OzonSyncWatermarks.synced_to).where(
+                    OzonSyncWatermarks.name == self.CAMPAIGNS_WATERMARK,
+                    OzonSyncWatermarks.client_id == self.client_id,
+                )
+            )
+            return result.scalar()
+
+    async def upload_campaigns_products(self, state=None, only_changed=False):
+        async with get_session() as session:
+            query = select(OzonCampaigns.campaign_id).where(
+                OzonCampaigns.client_id == self.client_id,
+                OzonCampaigns.state != "CAMPAIGN_STATE_ARCHIVED",
+            )
             if state in self.CAMPAIGN_STATUSES:
                 query = query.where(OzonCampaigns.state == state)
+            # Кампании без изменений после upload_campaigns пропускаем
+            if only_changed:
+                query = query.where(
+                    OzonCampaigns.campaign_id.in_(self.changed_campaign_ids)
+                )
 
             result = await session.execute(query)
-            campaigns = result.scalars()  # Получаем объекты модели
-
-            # Итерирование по результатам
-            values = []
-            for campaign in campaigns:
-                if campaign.state == "CAMPAIGN_STATE_ARCHIVED":
-                    continue
-                products = await self.get_campaign_products(campaign.campaign_id)
-
-                for product in products["list"]:
-                    values.append(
-                        {
-                            "campaign_id": campaign.campaign_id,
-                            "product_id": int(product["id"]),
-                        }
-                    )
-
-            stmt = (
-                pg_insert(OzonCampaignsProducts)
-                .values(values)
-                .on_conflict_do_nothing(index_elements=["campaign_id", "product_id"])
+            campaign_ids = list(result.scalars())
+
+        # Товары кампаний загружаем параллельно, не держа открытой транзакцию
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_CAMPAIGN_REQUESTS)
+
+        async def load(campaign_id):
+            async with semaphore:
+                products = await self.get_campaign_products(campaign_id)
+            return campaign_id, [int(product["id"]) for product in products["list"]]
+
+        campaigns_products = await asyncio.gather(
+            *(load(campaign_id) for campaign_id in campaign_ids)
+        )
+
+        values = [
+            {"campaign_id": campaign_id, "product_id": product_id}
+            for campaign_id, product_ids in campaigns_products
+            for product_id in product_ids
+        ]
+
+        # Удаляем связи с товарами, которых больше нет в кампании
+        table = OzonCampaignsProducts.__table__
+        product_ids = bindparam("b_product_ids", type_=ARRAY(Integer))
+        delete_stale = delete(table).where(
+            table.c.campaign_id == bindparam("b_campaign_id"),
+            table.c.product_id != all_(product_ids),
+        )
+
+        async with get_session() as session:
+            if campaigns_products:
+                await session.execute(
+                    delete_stale,
+                    [
+                        {"b_campaign_id": campaign_id, "b_product_ids": product_ids}
+                        for campaign_id, product_ids in campaigns_products
+                    ],
+                )
+            await bulk_upsert(
+                session,
+                OzonCampaignsProducts,
+                values,
+                ["campaign_id", "product_id"],
+                update=False,
             )
 
-            await session.execute(stmt)
+        logging.info(
+            f"Campaigns products synced: {len(values)} for {len(campaign_ids)} campaigns"
+        )
 
     async def get_campaign_products(self, campaign_id):
         if self.session is None:
             raise RuntimeError("Session not started")
 
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        async with self.session.get(f"/api/client/campaign/{campaign_id}/objects", ssl=ssl_context) as r:
+        async with self.session.get(f"/api/client/campaign/{campaign_id}/objects") as r:
             return await r.json()
 
     async def get_campaigns(self):
         if self.session is None:
             raise RuntimeError("Session not started")
 
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        async with self.session.get("/api/client/campaign?advObjectType=SKU", ssl=ssl_context) as r:
+        async with self.session.get("/api/client/campaign?advObjectType=SKU") as r:
             return await r.json()
@@ -1,31 +1,34 @@
-from datetime import datetime
-
-import aiohttp
 from multidict import CIMultiDict
 
+from services.http_pool import RateLimitedClientSession
+
 
-class OzonPerformanceClientSession(aiohttp.ClientSession):
+class OzonPerformanceClientSession(RateLimitedClientSession):
+    # Сколько раз повторяем запрос после 401/403 с обновленным токеном
+    MAX_AUTH_REPLAYS = 1
 
     def __init__(self, token_manager, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._token_manager = token_manager
 
     async def _request(self, method, url, **kwargs):
-        if (
-            self._token_manager.session_token_expired_at is not None
-            and self._token_manager.session_token_expired_at < datetime.now()
-        ):
-            await self._token_manager.refresh_session_token() 
+        # Запрос самого токена идет без авторизации
+        if str(url) == self._token_manager.TOKEN_URL:
+            return await super()._request(method, url, **kwargs)
 
-        response = await super()._request(method, url, **kwargs)
+        await self._token_manager.ensure_session_token()
 
-        if response.status not in (401, 403):
-            return response
-        else:
-            await self._token_manager.refresh_token()
-            await response.release()
+        replays = 0
+        while True:
+            token = self._token_manager.session_token
+            response = await super()._request(method, url, **kwargs)
 
-            return await super()._request(method, url, **kwargs)
+            if response.status not in (401, 403) or replays >= self.MAX_AUTH_REPLAYS:
+                return response
+
+            response.release()
+            replays += 1
+            await self._token_manager.refresh_session_token(stale_token=token)
 
     def set_headers(self, headers):
         self._default_headers = CIMultiDict(headers)
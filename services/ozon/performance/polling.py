@@ -0,0 +1,67 @@
+import random
+
+
+class StatisticsPollingStrategy:
+    # Первые опросы частые, затем интервал растет экспоненциально
+    FIRST_DELAY = 2
+    MIN_DELAY = 1
+    MAX_DELAY = 30
+    BACKOFF_FACTOR = 1.5
+    # Отдельная политика для ошибки "Превышен лимит активных запросов"
+    LIMIT_FIRST_DELAY = 5
+    LIMIT_MAX_DELAY = 60
+    LIMIT_BACKOFF_FACTOR = 2
+    JITTER = 0.2
+    # Вес нового замера в скользящем среднем времени генерации отчета
+    LATENCY_SMOOTHING = 0.3
+    # Первый опрос делаем немного раньше ожидаемой готовности
+    LATENCY_LEAD = 0.8
+
+    def __init__(self):
+        self.latencies = {}
+
+    def first_delay(self, chunk_size: int):
+        latency = self.latencies.get(chunk_size)
+        if latency is None:
+            return self._jitter(self.FIRST_DELAY)
+
+        return self._jitter(max(self.MIN_DELAY, latency * self.LATENCY_LEAD))
+
+    def poll_delay(self, attempt: int):
+        delay = self.FIRST_DELAY * self.BACKOFF_FACTOR**attempt
+        return self._jitter(min(self.MAX_DELAY, delay))
+
+    def limit_delay(self, attempt: int):
+        delay = self.LIMIT_FIRST_DELAY * self.LIMIT_BACKOFF_FACTOR**attempt
+        return self._jitter(min(self.LIMIT_MAX_DELAY, delay))
+
+    def record_latency(self, chunk_size: int, seconds: float):
+        latency = self.latencies.get(chunk_size)
+        if latency is None:
+            self.latencies[chunk_size] = seconds
+        else:
+            self.latencies[chunk_size] = (
+                latency * (1 - self.LATENCY_SMOOTHING) + seconds * self.LATENCY_SMOOTHING
+            )
+
+    def _jitter(self, delay: float):
+        return delay * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+
+class FixedPollingStrategy(StatisticsPollingStrategy):
+    def __init__(self, delay: float = 20):
+        super().__init__()
+        self.delay = delay
+
+    def first_delay(self, chunk_size: int):
+        return self.delay
+
+    def poll_delay(self, attempt: int):
+        return self.delay
+
+    def limit_delay(self, attempt: int):
+        return self.delay
+
+
+# Общая стратегия, чтобы статистика задержек накапливалась между клиентами
+default_polling_strategy = StatisticsPollingStrategy()
@@ -3,11 +3,14 @@ import logging
 from datetime import date, datetime, time
 
 import pandas as pd
-from sqlalchemy import and_, func, or_, select
+from sqlalchemy import or_, select
 
 from db.session import get_session
 from models.ozon import OzonCampaigns
+from services.ozon.schemas import STATISTICS_REPORT_SCHEMA
 from utils.array import divide_chunks
+from utils.arrow import RecordBatchBuilder
+from utils.json_stream import JsonItemsStream
 
 
 class OzonPerformanceStatisticsMethodsMixin:
@@ -17,32 +20,56 @@ class OzonPerformanceStatisticsMethodsMixin:
         return list(daily["id"].unique())
 
     async def get_campaigns_for_statistics_db(self, since: date, to: date):
+        since = datetime.combine(since, time.min)
+        to = datetime.combine(to, time.max)
+
+        # Кампании, которые могли работать в периоде. Условия по колонкам
+        # покрывающего индекса ix_ozon_campaigns_client_id_from_date
         async with get_session() as session:
             stmt = select(OzonCampaigns.campaign_id).where(
-                OzonCampaigns.from_date < since,
+                OzonCampaigns.client_id == self.client_id,
+                OzonCampaigns.from_date <= to,
                 or_(
                     OzonCampaigns.state == "CAMPAIGN_STATE_RUNNING",
-                    and_(
-                        OzonCampaigns.state != "CAMPAIGN_STATE_RUNNING",
-                        or_(
-                            and_(
-                                OzonCampaigns.to_date.isnot(None),
-                                OzonCampaigns.to_date > since,
-                                OzonCampaigns.to_date < func.now(),
-                            ),
-                            OzonCampaigns.updated_at > since,
-                        ),
-                    ),
+                    OzonCampaigns.to_date >= since,
+                    OzonCampaigns.updated_at >= since,
                 ),
-                OzonCampaigns.from_date < to,
             )
             result = await session.execute(stmt)
-            rows = result.fetchall()
-            campaign_ids = [row[0] for row in rows]
+            campaign_ids = list(result.scalars())
 
         return campaign_ids
 
-    async def statistics_request(self, campaign_ids: int, since: date, to: date):
+    async def discover_campaigns_for_statistics(self, since: date, to: date):
+        discovery = self.campaigns_discovery
+        if discovery == "auto":
+            synced_at = await self.get_campaigns_synced_at()
+            fresh = (
+                synced_at is not None
+                and datetime.now() - synced_at < self.CAMPAIGNS_SYNC_TTL
+            )
+            discovery = "db" if fresh else await self.sync_campaigns_for_statistics()
+
+        logging.info(f"Performance report load campaigns from {discovery}")
+        if discovery == "db":
+            return await self.get_campaigns_for_statistics_db(since, to)
+
+        return await self.get_campaigns_for_statistics(since, to)
+
+    async def sync_campaigns_for_statistics(self):
+        # Список кампаний - один запрос, дешевле дневной статистики за период.
+        # После синхронизации кампании берутся из БД, при ошибке - по http
+        try:
+            await self.upload_campaigns()
+        except Exception:
+            logging.exception("Campaigns sync failed, load campaigns from http")
+            return "http"
+
+        return "db"
+
+    async def create_statistics_report(
+        self, campaign_ids: list, since: date, to: date, group_by="NO_GROUP_BY"
+    ):
         if self.session is None:
             raise RuntimeError("Session not started")
 
@@ -59,7 +86,7 @@ class OzonPerformanceStatisticsMethodsMixin:
             "campaigns": campaign_ids,
             "from": since_str,
             "to": to_str,
-            "groupBy": "NO_GROUP_BY",
+            "groupBy": group_by,
         }
 
         retries = 0
@@ -72,85 +99,236 @@ class OzonPerformanceStatisticsMethodsMixin:
                 "/api/client/statistics/json", json=json_body
             ) as r:
                 response = await r.json()
-                error_value = response.get("error")
-
-                if error_value == "Превышен лимит активных запросов (максимум 1)":
-                    await asyncio.sleep(self.STATISTICS_RETRY_TIME)
-                    retries += 1
-                    continue
-                elif error_value:
-                    raise Exception(f"Получена ошибка: {error_value}")
+
+            error_value = response.get("error")
+
+            if error_value == self.ACTIVE_REQUESTS_LIMIT_ERROR:
+                await asyncio.sleep(self.polling.limit_delay(retries))
+                retries += 1
+                continue
+            elif error_value:
+                raise Exception(f"Получена ошибка: {error_value}")
+
+            uuid = response["UUID"]
+            logging.info(f"Report {uuid} created")
+
+            return uuid
+
+    async def wait_statistics_report(self, uuid: str, chunk_size: int):
+        if self.session is None:
+            raise RuntimeError("Session not started")
+
+        started_at = datetime.now()
+        await asyncio.sleep(self.polling.first_delay(chunk_size))
+        retries = 0
+
+        while True:
+            if retries > self.MAX_RETRIES:
+                raise RuntimeError("Max retries")
+
+            async with self.session.get(f"/api/client/statistics/{uuid}") as r:
+                chunk_info = await r.json()
+
+            state = chunk_info["state"]
+
+            logging.info(f"Report {uuid} state: {state} ")
+
+            if state != "NOT_STARTED" and state != "IN_PROGRESS":
+                if state == "OK":
+                    self.polling.record_latency(
+                        chunk_size, (datetime.now() - started_at).total_seconds()
+                    )
+                    return chunk_info
                 else:
-                    uuid = response["UUID"]
-                    logging.info(f"Report {uuid} created")
-                    await asyncio.sleep(self.STATISTICS_RETRY_TIME)
-                    chunk_info = None
-                    retries = 0
+                    raise RuntimeError(f"Retort error: {chunk_info}")
 
-                    while True:
-                        if retries > self.MAX_RETRIES:
-                            raise RuntimeError("Max retries")
+            await asyncio.sleep(self.polling.poll_delay(retries))
+            retries += 1
 
-                        async with self.session.get(
-                            f"/api/client/statistics/{uuid}"
-                        ) as r:
-                            chunk_info = await r.json()
+    async def download_statistics_report(self, uuid: str):
+        if self.session is None:
+            raise RuntimeError("Session not started")
 
-                            state = chunk_info["state"]
+        # Отчет разбирается потоково: {campaign_id: {report: {rows: [...]}}}
+        stream = JsonItemsStream(("*", "report", "rows"))
+        builder = RecordBatchBuilder(
+            self.STATISTICS_BATCH_SIZE, STATISTICS_REPORT_SCHEMA
+        )
 
-                            logging.info(f"Report {uuid} state: {state} ")
+        async with self.session.get(f"/api/client/statistics/report?UUID={uuid}") as r:
+            r.raise_for_status()
+            async for data in r.content.iter_chunked(self.STATISTICS_STREAM_CHUNK_SIZE):
+                for (campaign_id, *_), row in stream.feed(data):
+                    builder.append({"campaign_id": campaign_id, **row})
 
-                            if state != "NOT_STARTED" and state != "IN_PROGRESS":
-                                if state == "OK":
-                                    break
-                                else:
-                                    raise RuntimeError(f"Retort error: {chunk_info}")
+        for (campaign_id, *_), row in stream.close():
+            builder.append({"campaign_id": campaign_id, **row})
 
-                            await asyncio.sleep(self.STATISTICS_RETRY_TIME)
-                            retries += 1
+        self.check_statistics_report(uuid, stream)
 
-                    async with self.session.get(
-                        f"/api/client/statistics/report?UUID={uuid}"
-                    ) as r:
-                        chunk_report_raw = await r.json()
+        chunk_report = builder.to_pandas()
 
-                        chunk_report = []
-                        for campaign_id, campaign_data in chunk_report_raw.items():
-                            for row in campaign_data["report"]["rows"]:
-                                row_data = {"campaign_id": campaign_id}
-                                row_data.update(row)
-                                chunk_report.append(row_data)
+        logging.info(f"Report {uuid} loaded and prepared")
 
-                        chunk_report = pd.DataFrame(chunk_report)
+        return chunk_report
 
-                        logging.info(f"Report loaded and prepared")
+    def check_statistics_report(self, uuid: str, stream: JsonItemsStream):
+        # Ответ вида {"error": ...} или без report/rows не должен превратиться
+        # в пустой отчет: иначе кеш отметит дни как загруженные
+        if stream.unexpected:
+            path, value = stream.unexpected[0]
+            raise RuntimeError(f"Report {uuid} error: {'/'.join(path)}: {value}")
 
-                        return chunk_report
+        campaigns = {path[0] for path in stream.opened if len(path) == 1}
+        missing = [
+            campaign_id
+            for campaign_id in campaigns
+            if (campaign_id, "report", "rows") not in stream.opened
+        ]
+        if missing:
+            raise RuntimeError(f"Report {uuid} has no rows for campaigns {missing}")
 
-    async def get_statistics_report(self, since, to):
+    async def statistics_request(self, campaign_ids: list, since: date, to: date):
+        uuid = await self.create_statistics_report(campaign_ids, since, to)
+        await self.wait_statistics_report(uuid, len(campaign_ids))
+        return await self.download_statistics_report(uuid)
+
+    async def _download_statistics_chunk(
+        self, uuid: str, chunk: dict, job: tuple, queue: asyncio.Queue
+    ):
+        try:
+            chunk_report = await self.download_statistics_report(uuid)
+        except Exception as e:
+            await queue.put(e)
+            return
+
+        chunk["downloaded_at"] = datetime.now()
+        logging.info(f"Part {chunk['part']} loaded")
+        await queue.put((job, chunk_report))
+
+    async def _submit_statistics_jobs(
+        self, jobs: list, group_by: str, queue: asyncio.Queue, downloads: list
+    ):
+        try:
+            for part, job in enumerate(jobs, start=1):
+                ids, since, to = job
+                logging.info(f"Process campaigns part {part} ({since} - {to}): {ids}")
+                chunk = {"part": part, "campaigns": len(ids)}
+                self.statistics_timeline.append(chunk)
+
+                uuid = await self.create_statistics_report(ids, since, to, group_by)
+                chunk["uuid"] = uuid
+                chunk["submitted_at"] = datetime.now()
+
+                await self.wait_statistics_report(uuid, len(ids))
+                chunk["ready_at"] = datetime.now()
+
+                downloads.append(
+                    asyncio.create_task(
+                        self._download_statistics_chunk(uuid, chunk, job, queue)
+                    )
+                )
+
+            await asyncio.gather(*downloads)
+        finally:
+            await queue.put(None)
+
+    async def iter_statistics_pipeline(self, jobs: list, group_by="NO_GROUP_BY"):
+        # Ozon позволяет держать только один активный отчет, поэтому
+        # следующий отчет заказываем сразу после готовности предыдущего,
+        # а скачивание готовых отчетов идет параллельно с генерацией.
+        # Части отдаются по мере загрузки: (job, chunk_report)
+        self.statistics_timeline = []
+        queue = asyncio.Queue()
+        downloads = []
+        submitter = asyncio.create_task(
+            self._submit_statistics_jobs(jobs, group_by, queue, downloads)
+        )
+
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+            await submitter
+        finally:
+            submitter.cancel()
+            for download in downloads:
+                download.cancel()
+            self.log_statistics_timeline()
+
+    def log_statistics_timeline(self):
+        for chunk in self.statistics_timeline:
+            submitted_at = chunk.get("submitted_at")
+            ready_at = chunk.get("ready_at")
+            downloaded_at = chunk.get("downloaded_at")
+            if submitted_at is None or ready_at is None or downloaded_at is None:
+                logging.info(f"Part {chunk['part']} not finished: {chunk}")
+                continue
+
+            logging.info(
+                f"Part {chunk['part']} ({chunk['campaigns']} campaigns): "
+                f"submitted {submitted_at:%H:%M:%S}, "
+                f"ready in {(ready_at - submitted_at).total_seconds():.1f}s, "
+                f"downloaded in {(downloaded_at - ready_at).total_seconds():.1f}s"
+            )
+
+    async def iter_statistics_report(self, since, to):
         self.validate_dates(since, to)
 
-        logging.info("Performance report load campaigns")
-        campaign_ids = await self.get_campaigns_for_statistics(since, to)
+        campaign_ids = await self.discover_campaigns_for_statistics(since, to)
 
         logging.info(
             f"Campaigns loaded. Get statistics for {len(campaign_ids)} campaigns: {campaign_ids}"
         )
-        campaign_ids = divide_chunks(campaign_ids, self.MAX_CAMPAIGNS)
-
-        report = None
-        i = 1
-        for ids in campaign_ids:
-            logging.info(f"Process campaigns part {i}: {ids}")
-            chunk_report = await self.statistics_request(ids, since, to)
-            logging.info(f"Part {i} loaded")
-            if report is None:
-                report = chunk_report
-            else:
-                report = pd.concat([report, chunk_report])
-            i += 1
-
-        return report
+        if self.statistics_cache is not None:
+            async for chunk_report in self.iter_cached_statistics_report(
+                campaign_ids, since, to
+            ):
+                yield chunk_report
+            return
+
+        jobs = [
+            (ids, since, to) for ids in divide_chunks(campaign_ids, self.MAX_CAMPAIGNS)
+        ]
+        async for _, chunk_report in self.iter_statistics_pipeline(jobs):
+            yield chunk_report
+
+    async def iter_cached_statistics_report(self, campaign_ids: list, since, to):
+        today = datetime.now(self.zone).date()
+        cache = self.statistics_cache
+
+        # Для кеша статистика нужна в разбивке по дням
+        jobs = cache.plan(campaign_ids, since, to, today, self.MAX_CAMPAIGNS)
+
+        cached = cache.cached_rows(campaign_ids, since, to, today)
+        if not cached.empty:
+            yield cached
+
+        try:
+            async for job, chunk_report in self.iter_statistics_pipeline(
+                jobs, group_by="DATE"
+            ):
+                yield cache.store(chunk_report, [job], today)
+        finally:
+            cache.save()
+
+    async def get_statistics_report(self, since, to):
+        chunk_reports = [
+            chunk_report
+            async for chunk_report in self.iter_statistics_report(since, to)
+            if not chunk_report.empty
+        ]
+
+        return self.concat_statistics_chunks(chunk_reports)
+
+    def concat_statistics_chunks(self, chunk_reports: list):
+        # Один concat вместо копирования растущего отчета на каждой части
+        if not chunk_reports:
+            return pd.DataFrame()
+
+        return pd.concat(chunk_reports, ignore_index=True, copy=False)
 
     async def get_daily_report(self, since, to):
         if self.session is None:
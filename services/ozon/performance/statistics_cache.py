@@ -0,0 +1,152 @@
+import logging
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from utils.array import divide_chunks
+
+
+class OzonStatisticsCache:
+    ROWS_FILE = "rows.parquet"
+    COVERAGE_FILE = "coverage.parquet"
+    KEY_COLUMNS = ["campaign_id", "day"]
+
+    def __init__(self, path, client_id: str, fresh_days: int):
+        self.path = Path(path) / str(client_id)
+        self.fresh_days = fresh_days
+        self._rows = None
+        self._coverage = None
+        self._changed = False
+
+    def fresh_since(self, today: date):
+        # Последние fresh_days дней Ozon еще может пересчитать, их не кешируем
+        return today - timedelta(days=self.fresh_days - 1)
+
+    def load(self):
+        if self._rows is None:
+            self._rows = self._read(self.ROWS_FILE)
+            self._coverage = self._read(self.COVERAGE_FILE)
+
+    def missing_days(self, campaign_ids: list, since: date, to: date, today: date):
+        self.load()
+
+        fresh_since = self.fresh_since(today)
+        days = pd.date_range(since, to).date
+        covered = set(zip(self._coverage["campaign_id"], self._coverage["day"]))
+
+        missing = {}
+        for campaign_id in map(str, campaign_ids):
+            campaign_days = [
+                day
+                for day in days
+                if day >= fresh_since or (campaign_id, day) not in covered
+            ]
+            if campaign_days:
+                missing[campaign_id] = campaign_days
+
+        return missing
+
+    def plan(
+        self, campaign_ids: list, since: date, to: date, today: date, max_campaigns: int
+    ):
+        # Кампании с одинаковыми интервалами недостающих дней запрашиваем вместе
+        spans = {}
+        for campaign_id, days in self.missing_days(
+            campaign_ids, since, to, today
+        ).items():
+            for span in self._continuous_spans(days):
+                spans.setdefault(span, []).append(campaign_id)
+
+        jobs = []
+        for (span_since, span_to), ids in sorted(spans.items()):
+            for chunk in divide_chunks(ids, max_campaigns):
+                jobs.append((chunk, span_since, span_to))
+
+        logging.info(f"Statistics cache: {len(jobs)} requests needed")
+
+        return jobs
+
+    def _continuous_spans(self, days: list):
+        span_since = previous = days[0]
+        for day in days[1:]:
+            if day - previous > timedelta(days=1):
+                yield span_since, previous
+                span_since = day
+            previous = day
+
+        yield span_since, previous
+
+    def cached_rows(self, campaign_ids: list, since: date, to: date, today: date):
+        self.load()
+
+        rows = self._rows
+        return rows[
+            rows["campaign_id"].isin(list(map(str, campaign_ids)))
+            & (rows["day"] >= since)
+            & (rows["day"] <= to)
+            & (rows["day"] < self.fresh_since(today))
+        ]
+
+    def store(self, report: pd.DataFrame, jobs: list, today: date):
+        self.load()
+
+        fresh_since = self.fresh_since(today)
+        report = self.prepare_rows(report)
+
+        cells = pd.DataFrame(
+            [
+                (campaign_id, day)
+                for ids, since, to in jobs
+                for campaign_id in map(str, ids)
+                for day in pd.date_range(since, to).date
+                if day < fresh_since
+            ],
+            columns=self.KEY_COLUMNS,
+        )
+        if not cells.empty:
+            rows = self._rows.merge(
+                cells, on=self.KEY_COLUMNS, how="left", indicator=True
+            )
+            rows = rows[rows["_merge"] == "left_only"].drop(columns=["_merge"])
+
+            stored = report[report["day"] < fresh_since]
+            if not stored.empty:
+                rows = pd.concat([rows, stored]) if not rows.empty else stored
+            self._rows = rows
+            self._coverage = pd.concat([self._coverage, cells]).drop_duplicates()
+            self._changed = True
+
+        return report
+
+    def save(self):
+        if self._changed:
+            self._write(self._rows, self.ROWS_FILE)
+            self._write(self._coverage, self.COVERAGE_FILE)
+            self._changed = False
+
+    def prepare_rows(self, report: pd.DataFrame):
+        if report is None or report.empty:
+            return pd.DataFrame(columns=self.KEY_COLUMNS)
+
+        report = report.copy()
+        report["campaign_id"] = report["campaign_id"].astype(str)
+        report["day"] = pd.to_datetime(
+            report["date"], dayfirst=True, format="mixed"
+        ).dt.date
+
+        return report
+
+    def _read(self, name):
+        file = self.path / name
+        if not file.exists():
+            return pd.DataFrame(columns=self.KEY_COLUMNS)
+
+        return pd.read_parquet(file)
+
+    def _write(self, df: pd.DataFrame, name):
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path / f"{name}.tmp"
+        df.to_parquet(tmp_file, index=False)
+        os.replace(tmp_file, self.path / name)
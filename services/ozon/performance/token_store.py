@@ -0,0 +1,199 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from sqlalchemy import func, select, update
+
+from db.session import get_session
+from models.user import User
+
+
+class OzonPerformanceTokenStore(ABC):
+    # Токен считаем просроченным заранее, чтобы не отправить запрос
+    # с токеном, который истечет в пути
+    EXPIRY_MARGIN = 60
+
+    def __init__(self):
+        self._locks = {}
+
+    def is_valid(self, token: dict):
+        return (
+            token is not None
+            and token.get("expires_at", 0) - self.EXPIRY_MARGIN > time.time()
+        )
+
+    def lock(self, client_id: str):
+        lock = self._locks.get(client_id)
+        if lock is None:
+            lock = self._locks[client_id] = asyncio.Lock()
+
+        return lock
+
+    async def get_token(self, client):
+        token = await self.load(client.client_id)
+        if self.is_valid(token):
+            return token
+
+        return await self.refresh_token(client)
+
+    async def refresh_token(self, client, stale_token: str = None):
+        # Single-flight: токен обновляет один клиент, остальные ждут
+        # и берут уже сохраненный результат
+        async with self.lock(client.client_id):
+            async with self.exclusive(client.client_id):
+                token = await self.load(client.client_id)
+                if self.is_valid(token) and token["access_token"] != stale_token:
+                    return token
+
+                token = await client.request_session_token()
+                await self.save(client.client_id, token)
+                logging.info(f"Performance token for {client.client_id} refreshed")
+
+                return token
+
+    @abstractmethod
+    def exclusive(self, client_id: str):
+        pass
+
+    @abstractmethod
+    async def load(self, client_id: str):
+        pass
+
+    @abstractmethod
+    async def save(self, client_id: str, token: dict):
+        pass
+
+
+class _AdvisoryLock:
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = get_session()
+        session = await self._session.__aenter__()
+        # Блокировка между процессами, снимается с окончанием транзакции
+        await session.execute(
+            select(func.pg_advisory_xact_lock(func.hashtext(self.client_id)))
+        )
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self._session.__aexit__(exc_type, exc_value, traceback)
+
+
+class DBTokenStore(OzonPerformanceTokenStore):
+    # Токен хранится в users.ozon_performance_session_token. Для аккаунта
+    # из настроек строки users может не быть - тогда токен уходит в fallback
+    def __init__(self, fallback: OzonPerformanceTokenStore = None):
+        super().__init__()
+        self.fallback = fallback
+
+    def exclusive(self, client_id: str):
+        return _AdvisoryLock(client_id)
+
+    async def load(self, client_id: str):
+        async with get_session() as session:
+            result = await session.execute(
+                select(User.ozon_performance_session_token)
+                .where(
+                    User.ozon_performance_client_id == client_id,
+                    User.ozon_performance_session_token.isnot(None),
+                )
+                .limit(1)
+            )
+            value = result.scalar()
+
+        if value:
+            return json.loads(value)
+        if self.fallback is not None:
+            return await self.fallback.load(client_id)
+
+        return None
+
+    async def save(self, client_id: str, token: dict):
+        async with get_session() as session:
+            result = await session.execute(
+                update(User)
+                .where(User.ozon_performance_client_id == client_id)
+                .values(ozon_performance_session_token=json.dumps(token))
+            )
+
+        if result.rowcount:
+            return
+
+        if self.fallback is None:
+            logging.warning(
+                f"Performance token for {client_id} not saved: no user with this client_id"
+            )
+            return
+
+        await self.fallback.save(client_id, token)
+
+
+class _FileLock:
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd = None
+
+    async def __aenter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        await asyncio.to_thread(fcntl.flock, self._fd, fcntl.LOCK_EX)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+
+
+class FileTokenStore(OzonPerformanceTokenStore):
+    # Токены всех аккаунтов в одном JSON файле: {client_id: token}
+    def __init__(self, path):
+        super().__init__()
+        self.path = Path(path)
+
+    def exclusive(self, client_id: str):
+        return _FileLock(self.path.with_name(self.path.name + ".lock"))
+
+    def _read(self):
+        if not self.path.exists():
+            return {}
+
+        return json.loads(self.path.read_text() or "{}")
+
+    async def load(self, client_id: str):
+        return self._read().get(client_id)
+
+    async def save(self, client_id: str, token: dict):
+        tokens = self._read()
+        tokens[client_id] = token
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(tokens, f)
+        os.replace(tmp_path, self.path)
+
+
+_token_stores = {}
+
+
+def get_token_store(kind: str, path=None):
+    # Хранилище общее на процесс, чтобы блокировки были общими для клиентов
+    key = (kind, path)
+    store = _token_stores.get(key)
+    if store is None:
+        if kind == "db":
+            store = DBTokenStore(FileTokenStore(path) if path else None)
+        elif kind == "file":
+            store = FileTokenStore(path)
+        else:
+            raise ValueError(f"Неизвестное хранилище токенов: {kind}")
+        _token_stores[key] = store
+
+    return store
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import zoneinfo
 from datetime import date, datetime, time, timedelta
@@ -13,24 +14,35 @@ from yarl import URL
 
 from db.session import get_session
 from models.ozon import OzonCampaigns, OzonCampaignsProducts
+from services.http_pool import get_connector
 from services.ozon.performance.campaigns import OzonPerformanceCampaignsMixin
 from services.ozon.performance.client_session import OzonPerformanceClientSession
+from services.ozon.performance.polling import default_polling_strategy
 from services.ozon.performance.statistic_report import (
     OzonPerformanceStatisticsMethodsMixin,
 )
-
-import certifi
-import ssl
+from services.ozon.performance.statistics_cache import OzonStatisticsCache
+from services.ozon.performance.token_store import get_token_store
+from utils.rate_limiter import rate_limiters
 
 
 class OzonPerformanceClient(
     OzonPerformanceCampaignsMixin, OzonPerformanceStatisticsMethodsMixin
 ):
     BASE_URL = URL("https://api-performance.ozon.ru")
+    TOKEN_URL = "/api/client/token"
     MAX_DAYS = 62
     MAX_CAMPAIGNS = 10
-    STATISTICS_RETRY_TIME = 20
     MAX_RETRIES = 60
+    MAX_CONCURRENT_CAMPAIGN_REQUESTS = 5
+    # Кампании из БД используются, если синхронизация была не раньше
+    CAMPAIGNS_SYNC_TTL = timedelta(hours=12)
+    # Фоновое обновление токена: за EXPIRY_MARGIN до того, как он будет
+    # считаться просроченным, но не чаще раза в TOKEN_REFRESH_MIN_DELAY секунд
+    TOKEN_REFRESH_MIN_DELAY = 10
+    STATISTICS_STREAM_CHUNK_SIZE = 64 * 1024
+    STATISTICS_BATCH_SIZE = 10000
+    ACTIVE_REQUESTS_LIMIT_ERROR = "Превышен лимит активных запросов (максимум 1)"
     CAMPAIGNS_NEEDED_FIELDS = [
         "id",
         "title",
@@ -40,6 +52,7 @@ class OzonPerformanceClient(
         "createdAt",
         "updatedAt",
     ]
+    RATE_LIMITS = {None: (5, 1)}
     CAMPAIGN_STATUSES = {
         "CAMPAIGN_STATE_RUNNING",
         "CAMPAIGN_STATE_PLANNED",
@@ -52,29 +65,59 @@ class OzonPerformanceClient(
         "CAMPAIGN_STATE_FINISHED",
     }
 
-    def __init__(self, client_id: str, token: str, timezone):
+    def __init__(
+        self,
+        client_id: str,
+        token: str,
+        timezone,
+        polling_strategy=None,
+        statistics_cache_dir=None,
+        statistics_fresh_days: int = 3,
+        token_store=None,
+        campaigns_discovery="auto",
+    ):
         self.client_id = client_id
         self.token = token
         self.zone = zoneinfo.ZoneInfo(timezone)
+        self.polling = polling_strategy or default_polling_strategy
+        self.statistics_cache = None
+        if statistics_cache_dir:
+            self.statistics_cache = OzonStatisticsCache(
+                statistics_cache_dir, client_id, statistics_fresh_days
+            )
+        self.token_store = token_store or get_token_store("db")
+        # http - дневной отчет, db - ozon_campaigns, auto - по свежести синхронизации
+        self.campaigns_discovery = campaigns_discovery
         self.session = None
         self.session_token = None
         self.session_token_type = None
         self.session_token_expired_at = None
+        self._token_refresh_lock = asyncio.Lock()
+        self._token_refresh_task = None
+        self.statistics_timeline = []
+        self.changed_campaign_ids = []
+        self.campaigns_sync_stats = {}
 
     async def __aenter__(self):
         self.create_session()
-        await self.refresh_session_token()
+        self.set_session_token(await self.token_store.get_token(self))
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
         await self.close_session()
 
     def create_session(self):
+        rate_limiters.configure(self.BASE_URL.host, self.RATE_LIMITS)
         self.session = OzonPerformanceClientSession(
-            token_manager=self, base_url=self.BASE_URL
+            token_manager=self,
+            base_url=self.BASE_URL,
+            connector=get_connector(self.BASE_URL.host),
+            connector_owner=False,
         )
 
     async def close_session(self):
+        if self._token_refresh_task is not None:
+            self._token_refresh_task.cancel()
         await self.session.close()
 
     def validate_dates(self, since: date, to: date):
@@ -84,79 +127,112 @@ class OzonPerformanceClient(
                 f"Разница между датами составляет {delta.days} дней, что превышает допустимые {self.MAX_DAYS} дней."
             )
 
-    async def refresh_session_token(self):
-        self.session_token_expired_at = None
-        
+    def is_session_token_expired(self):
+        return (
+            self.session_token_expired_at is None
+            or self.session_token_expired_at < datetime.now()
+        )
+
+    async def ensure_session_token(self):
+        if self.is_session_token_expired():
+            await self.refresh_session_token(stale_token=self.session_token)
+
+    async def refresh_session_token(self, stale_token: str = None):
+        # Все запросы, получившие устаревший токен, ждут одного обновления
+        async with self._token_refresh_lock:
+            if (
+                self.session_token != stale_token
+                and not self.is_session_token_expired()
+            ):
+                return
+
+            token = await self.token_store.refresh_token(self, stale_token=stale_token)
+            self.set_session_token(token)
+
+    async def _refresh_session_token_later(self):
+        # Фоновое обновление до истечения, чтобы запросы не ждали токен
+        refresh_at = self.session_token_expired_at - timedelta(
+            seconds=self.token_store.EXPIRY_MARGIN
+        )
+        delay = (refresh_at - datetime.now()).total_seconds()
+        await asyncio.sleep(max(self.TOKEN_REFRESH_MIN_DELAY, delay))
+
+        try:
+            await self.refresh_session_token(stale_token=self.session_token)
+        except Exception:
+            logging.exception("Performance token background refresh failed")
+
+    async def request_session_token(self):
         json_body = {
             "client_id": self.client_id,
             "client_secret": self.token,
             "grant_type": "client_credentials",
         }
-        
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        async with self.session.post("/api/client/token", json=json_body, ssl=ssl_context) as r:
-            response = await r.json()
-            self.session_token = response["access_token"]
-            self.session_token_type = response["token_type"]
-            self.session_token_expired_at = datetime.now() + timedelta(
-                seconds=response["expires_in"] - 3
-            )
-            self.session.set_headers(
-                {
-                    "Authorization": f"{self.session_token_type} {self.session_token}",
-                    "Content-Type": "application/json",
-                    "Accept": "application/json",
-                }
-            )
 
-    async def get_statistics(self, since: date, to: date):
-        self.validate_dates(since, to)
-
-        logging.info(f"Performance statistics start loading since {since} to {to}")
-
-        report = await self.get_statistics_report(since, to)
-
-        # report.to_excel("data.xlsx", index=False)
-        # report = pd.read_excel("data.xlsx")
-
-        # report.to_parquet("data.parquet")
-        # report = pd.read_parquet("data.parquet")
+        async with self.session.post(self.TOKEN_URL, json=json_body) as r:
+            response = await r.json()
 
-        report_columns = {
-            "sku": "int",
-            "views": "int",
-            "clicks": "int",
-            "moneySpent": "float",
-            "avgBid": "float",
-            "orders": "int",
-            "ordersMoney": "float",
-            "models": "int",
-            "modelsMoney": "float",
-            "price": "float",
+        return {
+            "access_token": response["access_token"],
+            "token_type": response["token_type"],
+            "expires_at": datetime.now().timestamp() + response["expires_in"],
         }
 
-        report = report.drop(columns=["ctr", "title"])
-
-        for name in report_columns:
-            if report_columns[name] == "float":
-                report[name] = report[name].str.replace(",", ".")
-
-        report = report.astype(report_columns)
-        report = report.groupby("sku").agg(
+    def set_session_token(self, token: dict):
+        self.session_token = token["access_token"]
+        self.session_token_type = token["token_type"]
+        self.session_token_expired_at = datetime.fromtimestamp(
+            token["expires_at"]
+        ) - timedelta(seconds=self.token_store.EXPIRY_MARGIN)
+        self.session.set_headers(
             {
-                "views": "sum",
-                "clicks": "sum",
-                "moneySpent": "sum",
-                "avgBid": "mean",
-                "orders": "sum",
-                "ordersMoney": "sum",
-                "models": "sum",
-                "modelsMoney": "sum",
-                "campaign_id": lambda x: ", ".join(map(str, x)),
-                "price": "mean",
+                "Authorization": f"{self.session_token_type} {self.session_token}",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
             }
         )
 
-        logging.info("Performance statistics loaded and prepared")
+        refresh_task = self._token_refresh_task
+        if refresh_task is not None and refresh_task is not asyncio.current_task():
+            refresh_task.cancel()
+        self._token_refresh_task = asyncio.create_task(
+            self._refresh_session_token_later()
+        )
+
+
+STATISTICS_AGGREGATION = {
+    "views": "sum",
+    "clicks": "sum",
+    "moneySpent": "sum",
+    "avgBid": "mean",
+    "orders": "sum",
+    "ordersMoney": "sum",
+    "models": "sum",
+    "modelsMoney": "sum",
+    # При groupBy=DATE кампания повторяется в строке каждого дня
+    "campaign_id": lambda x: ", ".join(map(str, dict.fromkeys(x))),
+    "price": "mean",
+}
+
+
+def aggregate_statistics(report: pd.DataFrame):
+    # Без рекламы отчет пустой и без колонок: отдаем пустую агрегацию,
+    # чтобы в отчете остались только продажи
+    if report.empty:
+        return pd.DataFrame(
+            columns=list(STATISTICS_AGGREGATION),
+            dtype=float,
+            index=pd.Index([], dtype="int64", name="sku"),
+        )
 
-        return report
+    # Числовые колонки уже приведены к типам STATISTICS_REPORT_SCHEMA
+    report = report.drop(columns=["ctr", "title"])
+    # Ставка взвешивается по показам, поэтому не зависит от того, пришли
+    # строки по дням (кеш, groupBy=DATE) или одной строкой за период
+    report["bidViews"] = report["avgBid"] * report["views"]
+    report = report.groupby("sku").agg({**STATISTICS_AGGREGATION, "bidViews": "sum"})
+    report["avgBid"] = (report["bidViews"] / report["views"]).where(
+        report["views"] > 0, report["avgBid"]
+    )
+
+    return report.drop(columns=["bidViews"])
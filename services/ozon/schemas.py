@@ -0,0 +1,32 @@
+import pyarrow as pa
+
+# Типы числовых полей ответов Ozon API
+
+# /api/client/statistics/report
+STATISTICS_REPORT_SCHEMA = {
+    "sku": pa.int64(),
+    "views": pa.int64(),
+    "clicks": pa.int64(),
+    "moneySpent": pa.float64(),
+    "avgBid": pa.float64(),
+    "orders": pa.int64(),
+    "ordersMoney": pa.float64(),
+    "models": pa.int64(),
+    "modelsMoney": pa.float64(),
+    "price": pa.float64(),
+}
+
+# /v2/posting/fbo/list, result[].products[]
+FBO_POSTING_PRODUCT_SCHEMA = {
+    "sku": pa.int64(),
+    "quantity": pa.int64(),
+    "price": pa.float64(),
+}
+
+# /v3/product/info/list, items[]
+PRODUCT_INFO_SCHEMA = {
+    "sku": pa.int64(),
+    "name": pa.string(),
+    "offer_id": pa.string(),
+    "price": pa.float64(),
+}
@@ -1,13 +1,28 @@
-import aiohttp
+import asyncio
 import zoneinfo
 import logging
 from datetime import date, datetime, time, timedelta
-import pandas as pd
 from yarl import URL
 
+from services.http_pool import RateLimitedClientSession, get_connector
+from services.ozon.schemas import FBO_POSTING_PRODUCT_SCHEMA
+from services.ozon.seller_postings import OzonSellerPostingsMixin
+from services.ozon.seller_products import OzonSellerProductsMixin
+from utils.arrow import RecordBatchBuilder
+from utils.rate_limiter import rate_limiters
 
-class OzonSellerClient:
+
+class OzonSellerClient(OzonSellerPostingsMixin, OzonSellerProductsMixin):
     BASE_URL = URL("https://api-seller.ozon.ru/")
+    POSTINGS_PAGE_LIMIT = 1000
+    POSTINGS_WINDOW = timedelta(days=1)
+    MAX_CONCURRENT_REQUESTS = 5
+    # (запросов, за секунд) для всего хоста (None) и отдельных эндпоинтов
+    RATE_LIMITS = {
+        None: (20, 1),
+        "/v2/posting/fbo/list": (10, 1),
+        "/v3/product/info/list": (10, 1),
+    }
 
     def __init__(self, client_id: str, token: str, timezone):
         self.client_id = client_id
@@ -24,7 +39,13 @@ class OzonSellerClient:
 
     def create_session(self):
         headers = {"Client-Id": self.client_id, "Api-Key": self.token}
-        self.session = aiohttp.ClientSession(headers=headers, base_url=self.BASE_URL)
+        rate_limiters.configure(self.BASE_URL.host, self.RATE_LIMITS)
+        self.session = RateLimitedClientSession(
+            headers=headers,
+            base_url=self.BASE_URL,
+            connector=get_connector(self.BASE_URL.host),
+            connector_owner=False,
+        )
 
     async def close_session(self):
         await self.session.close()
@@ -54,12 +75,41 @@ class OzonSellerClient:
         if self.session is None:
             raise RuntimeError("Session not started")
 
-        since_str = (
-            datetime.combine(since, time.min).replace(tzinfo=self.zone).isoformat()
+        start = datetime.combine(since, time.min).replace(tzinfo=self.zone)
+        end = datetime.combine(to, time.max).replace(tzinfo=self.zone)
+
+        # Разбиваем период на окна и загружаем их параллельно
+        windows = []
+        while start <= end:
+            window_end = min(
+                start + self.POSTINGS_WINDOW - timedelta(microseconds=1), end
+            )
+            windows.append((start, window_end))
+            start = window_end + timedelta(microseconds=1)
+
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        windows_items = await asyncio.gather(
+            *(
+                self.get_posting_fbo_window(window_since, window_to, semaphore)
+                for window_since, window_to in windows
+            )
         )
-        to_str = datetime.combine(to, time.max).replace(tzinfo=self.zone).isoformat()
+
+        # Отправление на границе окон может попасть в оба окна
+        all_items = {}
+        for items in windows_items:
+            for item in items:
+                all_items[item["posting_number"]] = item
+
+        logging.info(f"FBO postings loaded: {len(all_items)} in {len(windows)} windows")
+
+        return list(all_items.values())
+
+    async def get_posting_fbo_window(
+        self, since: datetime, to: datetime, semaphore: asyncio.Semaphore
+    ):
         url = "/v2/posting/fbo/list"
-        limit = 1000
+        limit = self.POSTINGS_PAGE_LIMIT
         offset = 0
         all_items = []
 
@@ -67,9 +117,9 @@ class OzonSellerClient:
             json_body = {
                 "dir": "ASC",
                 "filter": {
-                    "since": since_str,
+                    "since": since.isoformat(),
                     "status": "",
-                    "to": to_str,
+                    "to": to.isoformat(),
                 },
                 "limit": limit,
                 "offset": offset,
@@ -77,8 +127,9 @@ class OzonSellerClient:
                 "with": {"analytics_data": False, "financial_data": False},
             }
 
-            async with self.session.post(url, json=json_body) as r:
-                response = await r.json()
+            async with semaphore:
+                async with self.session.post(url, json=json_body) as r:
+                    response = await r.json()
 
             items = response["result"]
             all_items.extend(items)
@@ -94,7 +145,7 @@ class OzonSellerClient:
         logging.info(f"FBO orders start loading since {since} to {to}")
         orders = await self.get_posting_fbo_list(since, to)
 
-        product_siles = []
+        product_siles = RecordBatchBuilder(schema=FBO_POSTING_PRODUCT_SCHEMA)
 
         for order in orders:
             if order["status"] == "cancelled":
@@ -103,9 +154,8 @@ class OzonSellerClient:
             for product in products:
                 product_siles.append(product)
 
-        products = pd.DataFrame(product_siles)
+        products = product_siles.to_pandas()
         products = products.drop(columns=["digital_codes"])
-        products["price"] = products["price"].str.replace(",", ".").astype("float")
         products["profit"] = products["quantity"] * products["price"]
         products = products.groupby("sku").agg(
             {
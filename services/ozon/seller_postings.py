@@ -0,0 +1,201 @@
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from db.session import get_session
+from db.upsert import bulk_upsert
+from models.ozon import OzonPostings, OzonPostingsProducts, OzonSyncWatermarks
+
+
+class OzonSellerPostingsMixin:
+    POSTINGS_WATERMARK = "fbo_postings"
+    # Статус отправления может меняться еще несколько дней после создания.
+    # Водяной знак хранит непрерывный период дней, загруженных уже после
+    # этого срока: такие дни повторно не запрашиваются
+    POSTINGS_REFRESH_DAYS = 14
+    POSTINGS_TIME_FIELDS = ["created_at", "in_process_at"]
+
+    async def get_postings_watermark(self):
+        async with get_session() as session:
+            result = await session.execute(
+                select(OzonSyncWatermarks).where(
+                    OzonSyncWatermarks.name == self.POSTINGS_WATERMARK,
+                    OzonSyncWatermarks.client_id == self.client_id,
+                )
+            )
+            return result.scalars().first()
+
+    async def sync_postings(self, since: date, to: date):
+        # Загружается только период отчета без уже окончательных дней
+        final_to = datetime.now(self.zone).date() - timedelta(
+            days=self.POSTINGS_REFRESH_DAYS
+        )
+        watermark = await self.get_postings_watermark()
+
+        # Период отчета продолжает окончательный период водяного знака
+        continues = (
+            watermark is not None
+            and watermark.synced_from.date()
+            <= since
+            <= watermark.synced_to.date() + timedelta(days=1)
+        )
+        if continues:
+            synced_to = watermark.synced_to.date()
+            sync_since = synced_to + timedelta(days=1)
+            new_from = watermark.synced_from.date()
+            new_to = max(synced_to, min(to, final_to))
+        else:
+            sync_since = new_from = since
+            new_to = min(to, final_to)
+
+        if sync_since > to:
+            logging.info(f"FBO postings since {since} to {to} already synced")
+            return
+
+        logging.info(f"FBO postings sync since {sync_since} to {to}")
+        postings = await self.get_posting_fbo_list(sync_since, to)
+
+        posting_values, product_values = self._prepare_postings(postings)
+
+        async with get_session() as session:
+            await bulk_upsert(session, OzonPostings, posting_values, ["posting_number"])
+            await bulk_upsert(
+                session,
+                OzonPostingsProducts,
+                product_values,
+                ["posting_number", "sku"],
+            )
+            if new_to >= new_from:
+                await bulk_upsert(
+                    session,
+                    OzonSyncWatermarks,
+                    [
+                        {
+                            "name": self.POSTINGS_WATERMARK,
+                            "client_id": self.client_id,
+                            "synced_from": datetime.combine(new_from, time.min),
+                            "synced_to": datetime.combine(new_to, time.min),
+                        }
+                    ],
+                    ["name", "client_id"],
+                )
+
+        logging.info(f"FBO postings synced: {len(posting_values)}")
+
+    def _prepare_postings(self, postings: list):
+        if not postings:
+            return [], []
+
+        synced_at = datetime.now()
+        products = {}
+        for posting in postings:
+            for product in posting["products"]:
+                key = (posting["posting_number"], int(product["sku"]))
+                quantity = int(product["quantity"])
+                price = Decimal(str(product["price"]).replace(",", "."))
+
+                # Один SKU может встречаться в отправлении несколько раз, а
+                # строка (posting_number, sku) уникальна: объединяем позиции,
+                # сохраняя сумму через среднюю цену
+                value = products.get(key)
+                if value is not None:
+                    total = value["quantity"] * value["price"] + quantity * price
+                    value["quantity"] += quantity
+                    if value["quantity"]:
+                        value["price"] = total / value["quantity"]
+                    continue
+
+                products[key] = {
+                    "posting_number": key[0],
+                    "sku": key[1],
+                    "offer_id": product.get("offer_id"),
+                    "name": product.get("name"),
+                    "quantity": quantity,
+                    "price": price,
+                    "currency_code": product.get("currency_code"),
+                }
+        product_values = list(products.values())
+
+        postings = pd.DataFrame(postings)
+        postings = postings[
+            ["posting_number", "order_id", "order_number", "status"]
+            + self.POSTINGS_TIME_FIELDS
+        ]
+        for name in self.POSTINGS_TIME_FIELDS:
+            postings[name] = pd.to_datetime(postings[name], utc=True).dt.tz_localize(
+                None
+            )
+        postings["client_id"] = self.client_id
+        postings["synced_at"] = synced_at
+        postings = postings.astype(object).replace({np.nan: None, pd.NaT: None})
+
+        return postings.to_dict(orient="records"), product_values
+
+    def _to_utc(self, d: date, t: time):
+        return (
+            datetime.combine(d, t)
+            .replace(tzinfo=self.zone)
+            .astimezone(timezone.utc)
+            .replace(tzinfo=None)
+        )
+
+    async def get_sales_statistics_db(self, since: date, to: date):
+        stmt = (
+            select(
+                OzonPostingsProducts.sku,
+                func.min(OzonPostingsProducts.name).label("name"),
+                func.sum(OzonPostingsProducts.quantity).label("quantity"),
+                func.min(OzonPostingsProducts.offer_id).label("offer_id"),
+                func.max(OzonPostingsProducts.price).label("price"),
+                func.sum(
+                    OzonPostingsProducts.quantity * OzonPostingsProducts.price
+                ).label("profit"),
+                func.min(OzonPostingsProducts.currency_code).label("currency_code"),
+            )
+            .join(
+                OzonPostings,
+                OzonPostings.posting_number == OzonPostingsProducts.posting_number,
+            )
+            .where(
+                OzonPostings.client_id == self.client_id,
+                OzonPostings.status != "cancelled",
+                OzonPostings.created_at >= self._to_utc(since, time.min),
+                OzonPostings.created_at <= self._to_utc(to, time.max),
+            )
+            .group_by(OzonPostingsProducts.sku)
+        )
+
+        async with get_session() as session:
+            result = await session.execute(stmt)
+            rows = result.mappings().all()
+
+        products = pd.DataFrame(
+            rows,
+            columns=[
+                "sku",
+                "name",
+                "quantity",
+                "offer_id",
+                "price",
+                "profit",
+                "currency_code",
+            ],
+        )
+        products = products.astype({"price": "float", "profit": "float"})
+        products.set_index("sku", inplace=True)
+
+        return products
+
+    async def synced_products_statistics(self, since: date, to: date):
+        logging.info(f"FBO orders start syncing since {since} to {to}")
+        await self.sync_postings(since, to)
+
+        products = await self.get_sales_statistics_db(since, to)
+
+        logging.info(f"FBO orders aggregated from local postings")
+
+        return products
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from db.session import get_session
+from db.upsert import MAX_BIND_PARAMS, bulk_upsert
+from models.ozon import OzonProducts
+from utils.array import divide_chunks
+
+
+class OzonSellerProductsMixin:
+    # Ограничение /v3/product/info/list на количество SKU в запросе
+    PRODUCTS_BATCH_SIZE = 1000
+    MAX_CONCURRENT_PRODUCT_REQUESTS = 4
+    # Через сколько запись каталога считается устаревшей
+    PRODUCTS_TTL = timedelta(days=7)
+    # SKU, которых Ozon не вернул, не запрашиваем повторно в течение суток
+    MISSING_PRODUCTS_TTL = timedelta(days=1)
+
+    async def get_catalog_products(self, skus: list):
+        products = {}
+
+        async with get_session() as session:
+            for chunk in divide_chunks(skus, MAX_BIND_PARAMS):
+                result = await session.execute(
+                    select(OzonProducts).where(OzonProducts.sku.in_(chunk))
+                )
+                for product in result.scalars():
+                    products[product.sku] = product
+
+        return products
+
+    async def get_products_by_sku_cached(self, skus: list):
+        skus = list(dict.fromkeys(int(sku) for sku in skus))
+        now = datetime.now()
+
+        catalog = await self.get_catalog_products(skus)
+        products = []
+        known_skus = set()
+        for product in catalog.values():
+            ttl = self.PRODUCTS_TTL if product.found else self.MISSING_PRODUCTS_TTL
+            if product.updated_at <= now - ttl:
+                continue
+
+            known_skus.add(product.sku)
+            if product.found:
+                products.append(
+                    {
+                        "sku": product.sku,
+                        "name": product.name,
+                        "offer_id": product.offer_id,
+                        "price": (
+                            float(product.price) if product.price is not None else None
+                        ),
+                    }
+                )
+
+        missed_skus = [sku for sku in skus if sku not in known_skus]
+        if missed_skus:
+            products.extend(await self.resolve_products(missed_skus))
+
+        return products
+
+    async def resolve_products(self, skus: list):
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_PRODUCT_REQUESTS)
+
+        async def load(batch):
+            async with semaphore:
+                return await self.get_pruducts_by_sku(batch)
+
+        batches = await asyncio.gather(
+            *(load(batch) for batch in divide_chunks(skus, self.PRODUCTS_BATCH_SIZE))
+        )
+
+        updated_at = datetime.now()
+        requested = set(skus)
+        products = {}
+        for items in batches:
+            for item in items:
+                # Товар мог быть запрошен по любому из SKU его источников
+                item_skus = [int(source["sku"]) for source in item.get("sources", [])]
+                if "sku" in item:
+                    item_skus.append(int(item["sku"]))
+                matched = [sku for sku in item_skus if sku in requested]
+                if not matched and "sku" in item:
+                    matched = [int(item["sku"])]
+
+                price = item.get("price")
+                price = Decimal(str(price).replace(",", ".")) if price else None
+                for sku in matched:
+                    products[sku] = {
+                        "sku": sku,
+                        "name": item.get("name"),
+                        "offer_id": item.get("offer_id"),
+                        "price": price,
+                    }
+
+        # Ненайденные SKU запоминаем, чтобы не запрашивать их на каждом отчете
+        missing = [sku for sku in skus if sku not in products]
+        values = [
+            {**product, "client_id": self.client_id, "found": True}
+            for product in products.values()
+        ] + [
+            {
+                "sku": sku,
+                "client_id": self.client_id,
+                "name": None,
+                "offer_id": None,
+                "price": None,
+                "found": False,
+            }
+            for sku in missing
+        ]
+        for value in values:
+            value["updated_at"] = updated_at
+
+        async with get_session() as session:
+            await bulk_upsert(session, OzonProducts, values, ["sku"])
+
+        logging.info(
+            f"Product catalog updated: {len(products)} found, "
+            f"{len(missing)} missing of {len(skus)} skus"
+        )
+
+        return [
+            {
+                **product,
+                "price": (
+                    float(product["price"]) if product["price"] is not None else None
+                ),
+            }
+            for product in products.values()
+        ]
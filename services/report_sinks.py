@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openpyxl import Workbook
+
+from services.google_exporter import GoogleSheetsExporter
+
+
+class ReportSink(ABC):
+    # Получатель готового DRR отчета
+    name = "sink"
+
+    @abstractmethod
+    async def write(self, report: pd.DataFrame, account: str, since: date, to: date):
+        pass
+
+
+class FileReportSink(ReportSink):
+    # Запись на диск идет в потоке, чтобы несколько получателей
+    # работали параллельно
+    async def write(self, report: pd.DataFrame, account: str, since: date, to: date):
+        await asyncio.to_thread(self.write_sync, report, account, since, to)
+
+    @abstractmethod
+    def write_sync(self, report: pd.DataFrame, account: str, since: date, to: date):
+        pass
+
+    @staticmethod
+    def file_name(since: date, to: date, extension: str):
+        return f"drr_{since}_{to}.{extension}"
+
+    @staticmethod
+    def replace_file(path: str, write):
+        # Пишем во временный файл, чтобы не оставлять недописанный отчет
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            write(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+class ParquetSink(FileReportSink):
+    # Архив строк отчета: {path}/account=.../month=YYYY-MM/drr_since_to.parquet,
+    # строка ИТОГО не сохраняется
+    name = "parquet"
+
+    def __init__(self, path: str, batch_size: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+
+    def write_sync(self, report: pd.DataFrame, account: str, since: date, to: date):
+        rows = report[report["offer_id"] != "ИТОГО"].reset_index()
+        rows.insert(0, "since", since)
+        rows.insert(1, "to", to)
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+
+        path = os.path.join(
+            self.path,
+            f"account={account}",
+            f"month={since:%Y-%m}",
+            self.file_name(since, to, "parquet"),
+        )
+
+        def write(tmp_path):
+            with pq.ParquetWriter(tmp_path, table.schema) as writer:
+                for batch in table.to_batches(max_chunksize=self.batch_size):
+                    writer.write_batch(batch)
+
+        self.replace_file(path, write)
+
+
+class CSVSink(FileReportSink):
+    name = "csv"
+
+    def __init__(self, path: str, chunksize: int = 10000):
+        self.path = path
+        self.chunksize = chunksize
+
+    def write_sync(self, report: pd.DataFrame, account: str, since: date, to: date):
+        path = os.path.join(self.path, account, self.file_name(since, to, "csv"))
+        self.replace_file(
+            path,
+            lambda tmp_path: report.to_csv(
+                tmp_path, index=True, chunksize=self.chunksize
+            ),
+        )
+
+
+class XLSXSink(FileReportSink):
+    # write_only режим openpyxl: строки не держатся в памяти целиком
+    name = "xlsx"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def write_sync(self, report: pd.DataFrame, account: str, since: date, to: date):
+        path = os.path.join(self.path, account, self.file_name(since, to, "xlsx"))
+
+        def write(tmp_path):
+            workbook = Workbook(write_only=True)
+            worksheet = workbook.create_sheet(f"{since} - {to}")
+            rows = report.reset_index()
+            worksheet.append(list(rows.columns))
+            for row in rows.itertuples(index=False):
+                worksheet.append([None if pd.isna(value) else value for value in row])
+            workbook.save(tmp_path)
+
+        self.replace_file(path, write)
+
+
+class GoogleSheetsSink(ReportSink):
+    name = "gsheets"
+
+    def __init__(self, exporter: GoogleSheetsExporter, gsheet_url: str):
+        self.exporter = exporter
+        self.gsheet_url = gsheet_url
+
+    async def write(self, report: pd.DataFrame, account: str, since: date, to: date):
+        await self.exporter.append_drr_report(self.gsheet_url, report, since, to)
+
+
+class ReportSinksError(RuntimeError):
+    def __init__(self, account: str, errors: dict):
+        super().__init__(
+            f"DRR report for {account} was not written to {', '.join(errors)}"
+        )
+        self.errors = errors
+
+
+FILE_SINKS = {sink.name: sink for sink in (ParquetSink, CSVSink, XLSXSink)}
+
+
+def build_report_sinks(formats: str, path: str):
+    # formats - список через запятую, например "parquet,csv"
+    names = [name.strip() for name in (formats or "").split(",") if name.strip()]
+    unknown = set(names) - set(FILE_SINKS)
+    if unknown:
+        raise ValueError(f"Unknown report sinks: {unknown}")
+
+    return [FILE_SINKS[name](os.path.join(path, name)) for name in names]
+
+
+async def write_report_sinks(
+    sinks: list, report: pd.DataFrame, account: str, since: date, to: date
+):
+    # Один готовый отчет пишется во все получатели параллельно,
+    # ошибка одного получателя не мешает остальным, но после записи
+    # отчет с ошибкой считается неуспешным
+    results = await asyncio.gather(
+        *(sink.write(report, account, since, to) for sink in sinks),
+        return_exceptions=True,
+    )
+
+    errors = {}
+    for sink, result in zip(sinks, results):
+        if isinstance(result, Exception):
+            errors[sink.name] = result
+            logging.error(
+                f"DRR report for {account} was not written to {sink.name}",
+                exc_info=result,
+            )
+
+    if errors:
+        raise ReportSinksError(account, errors)
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from utils.json_stream import JsonItemsStream
+
+ROWS_PATH = ("*", "report", "rows")
+
+REPORT = {
+    "1": {
+        "cnt": 12.5,
+        "ratio": -1.25e-3,
+        "title": 'Кампания, "1"',
+        "report": {
+            "rows": [
+                {"sku": "101", "views": 3, "price": 1.5, "ctr": -12.5e2},
+                1.5,
+                -3,
+                0,
+                [1, 2.25],
+                None,
+                True,
+            ],
+            "totals": {"views": 3},
+        },
+    },
+    "22": {"report": {"rows": [], "extra": [10, 20.75]}, "cnt": 3},
+}
+
+
+def expected_items():
+    return [(("1", "report", "rows"), row) for row in REPORT["1"]["report"]["rows"]]
+
+
+def parse(data: bytes, chunk_size: int):
+    stream = JsonItemsStream(ROWS_PATH)
+    items = []
+    for start in range(0, len(data), chunk_size):
+        items.extend(stream.feed(data[start : start + chunk_size]))
+    items.extend(stream.close())
+    return items
+
+
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")])
+@pytest.mark.parametrize("chunk_size", list(range(1, 17)) + [64, 4096])
+def test_chunk_size_sweep(chunk_size, separators):
+    data = json.dumps(REPORT, ensure_ascii=False, separators=separators).encode()
+
+    assert parse(data, chunk_size) == expected_items()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3])
+def test_number_at_end_of_array(chunk_size):
+    data = b'{"1":{"report":{"rows":[1.5]}}}'
+
+    assert parse(data, chunk_size) == [(("1", "report", "rows"), 1.5)]
+
+
+def test_truncated_stream():
+    stream = JsonItemsStream(ROWS_PATH)
+    stream.feed(b'{"1":{"report":{"rows":[1.')
+
+    with pytest.raises(ValueError):
+        stream.close()
+
+
+def test_shape_tracking():
+    stream = JsonItemsStream(ROWS_PATH)
+    stream.feed(b'{"error": "limit", "1": {"report": {"rows": []}}, "2": {"cnt": 1}}')
+    stream.close()
+
+    assert stream.unexpected == [(("error",), "limit")]
+    assert stream.opened == {
+        (),
+        ("1",),
+        ("1", "report"),
+        ("1", "report", "rows"),
+        ("2",),
+    }
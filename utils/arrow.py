@@ -0,0 +1,92 @@
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Пробелы (в том числе неразрывные) как разделители разрядов
+THOUSANDS_SEPARATORS = r"[\s\x{00a0}\x{202f}]"
+
+
+def parse_number(array, type: pa.DataType):
+    # Числа Ozon приходят строками с запятой в качестве десятичного разделителя
+    if not (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+        return pc.cast(array, type)
+
+    array = pc.cast(array, pa.string())
+    array = pc.replace_substring_regex(array, THOUSANDS_SEPARATORS, "")
+    array = pc.replace_substring(array, ",", ".")
+    array = pc.if_else(pc.equal(array, ""), pa.scalar(None, pa.string()), array)
+
+    return pc.cast(array, type)
+
+
+def apply_schema(data, schema: dict):
+    # Приводит колонки RecordBatch/Table к типам схемы, не трогая остальные
+    for name, type in schema.items():
+        index = data.schema.get_field_index(name)
+        if index == -1:
+            continue
+
+        column = data.column(index)
+        if pa.types.is_integer(type) or pa.types.is_floating(type):
+            column = parse_number(column, type)
+        else:
+            column = pc.cast(column, type)
+        data = data.set_column(index, name, column)
+
+    return data
+
+
+def records_to_pandas(records: list, schema: dict, columns: list = None):
+    columns = columns or list(schema)
+    table = pa.Table.from_pylist(
+        [{name: record.get(name) for name in columns} for record in records]
+    )
+    if not records:
+        table = pa.table({name: pa.array([], pa.string()) for name in columns})
+
+    return apply_schema(table, schema).to_pandas()
+
+
+class RecordBatchBuilder:
+    # Накапливает строки в колоночных буферах и сбрасывает их в Arrow
+    # RecordBatch каждые batch_size строк, приводя колонки к типам schema
+    def __init__(self, batch_size: int = 10000, schema: dict = None):
+        self.batch_size = batch_size
+        self.schema = schema or {}
+        self.batches = []
+        self._columns = {}
+        self._size = 0
+
+    def append(self, row: dict):
+        for name, value in row.items():
+            column = self._columns.get(name)
+            if column is None:
+                column = self._columns[name] = [None] * self._size
+            column.append(value)
+
+        self._size += 1
+        for column in self._columns.values():
+            if len(column) < self._size:
+                column.append(None)
+
+        if self._size >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._size:
+            batch = pa.RecordBatch.from_pydict(self._columns)
+            self.batches.append(apply_schema(batch, self.schema))
+            self._columns = {}
+            self._size = 0
+
+    def to_table(self):
+        self.flush()
+        if not self.batches:
+            return pa.table({})
+
+        return pa.concat_tables(
+            [pa.Table.from_batches([batch]) for batch in self.batches],
+            promote_options="default",
+        )
+
+    def to_pandas(self):
+        return self.to_table().to_pandas()
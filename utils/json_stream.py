@@ -0,0 +1,175 @@
+import codecs
+import json
+
+WHITESPACE = " \t\n\r"
+NUMBER_START = "-0123456789"
+NUMBER_END = ",]}" + WHITESPACE
+
+
+class _Frame:
+    __slots__ = ("kind", "state", "path", "key")
+
+    def __init__(self, kind, state, path):
+        self.kind = kind
+        self.state = state
+        self.path = path
+        self.key = None
+
+
+class JsonItemsStream:
+    # Инкрементальный разбор JSON: возвращает элементы массивов, лежащих по
+    # пути path (ключи объектов, "*" - любой ключ). Остальные значения
+    # пропускаются, поэтому в памяти держится только необработанный хвост.
+    def __init__(self, path: tuple):
+        self.path = tuple(path)
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._stack = []
+        self._finished = False
+        # Пути контейнеров, в которые зашел разбор, и значения на пути к
+        # path, которые оказались не объектом/массивом - для проверки формы
+        self.opened = set()
+        self.unexpected = []
+
+    def feed(self, data: bytes):
+        self._buffer += self._text_decoder.decode(data)
+        return self._parse(eof=False)
+
+    def close(self):
+        self._buffer += self._text_decoder.decode(b"", final=True)
+        items = self._parse(eof=True)
+        if not self._finished or self._buffer.strip(WHITESPACE):
+            raise ValueError("Unexpected end of JSON stream")
+
+        return items
+
+    def _match(self, path: tuple):
+        if len(path) > len(self.path):
+            return None
+        for key, pattern in zip(path, self.path):
+            if pattern != "*" and pattern != key:
+                return None
+
+        return "target" if len(path) == len(self.path) else "prefix"
+
+    def _decode(self, buf: str, pos: int, eof: bool):
+        try:
+            value, end = self._decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            return None, None
+
+        # Число может быть обрезано границей чанка ("1.", "-12.5e"): считаем
+        # его полным, только если за ним уже есть разделитель
+        if (
+            not eof
+            and buf[pos] in NUMBER_START
+            and (end == len(buf) or buf[end] not in NUMBER_END)
+        ):
+            return None, None
+
+        return value, end
+
+    def _open(self, ch: str, path: tuple):
+        match = self._match(path)
+        if match == "prefix" and ch == "{":
+            self._stack.append(_Frame("object", "key_or_end", path))
+            self.opened.add(path)
+            return True
+        if match == "target" and ch == "[":
+            self._stack.append(_Frame("array", "value_or_end", path))
+            self.opened.add(path)
+            return True
+
+        return False
+
+    def _close(self):
+        self._stack.pop()
+        if not self._stack:
+            self._finished = True
+
+    def _parse(self, eof: bool):
+        items = []
+        buf = self._buffer
+        pos = 0
+
+        while True:
+            while pos < len(buf) and buf[pos] in WHITESPACE:
+                pos += 1
+            if pos >= len(buf):
+                break
+
+            ch = buf[pos]
+
+            if not self._stack:
+                if self._finished or not self._open(ch, ()):
+                    raise ValueError(f"Unexpected JSON at position {pos}: {ch!r}")
+                pos += 1
+                continue
+
+            frame = self._stack[-1]
+
+            if frame.kind == "object":
+                if frame.state in ("key", "key_or_end"):
+                    if ch == "}" and frame.state == "key_or_end":
+                        self._close()
+                        pos += 1
+                        continue
+                    key, end = self._decode(buf, pos, eof)
+                    if end is None:
+                        break
+                    frame.key = key
+                    frame.state = "colon"
+                    pos = end
+                elif frame.state == "colon":
+                    if ch != ":":
+                        raise ValueError(f"Expected ':' at position {pos}")
+                    frame.state = "value"
+                    pos += 1
+                elif frame.state == "value":
+                    if self._open(ch, frame.path + (frame.key,)):
+                        frame.state = "comma_or_end"
+                        pos += 1
+                        continue
+                    value, end = self._decode(buf, pos, eof)
+                    if end is None:
+                        break
+                    path = frame.path + (frame.key,)
+                    if self._match(path) is not None:
+                        self.unexpected.append((path, value))
+                    frame.state = "comma_or_end"
+                    pos = end
+                else:
+                    if ch == ",":
+                        frame.state = "key"
+                    elif ch == "}":
+                        self._close()
+                    else:
+                        raise ValueError(f"Expected ',' or '}}' at position {pos}")
+                    pos += 1
+            else:
+                if frame.state in ("value", "value_or_end"):
+                    if ch == "]" and frame.state == "value_or_end":
+                        self._close()
+                        pos += 1
+                        continue
+                    item, end = self._decode(buf, pos, eof)
+                    if end is None:
+                        break
+                    items.append((frame.path, item))
+                    frame.state = "comma_or_end"
+                    pos = end
+                else:
+                    if ch == ",":
+                        frame.state = "value"
+                    elif ch == "]":
+                        self._close()
+                    else:
+                        raise ValueError(f"Expected ',' or ']' at position {pos}")
+                    pos += 1
+
+        self._buffer = buf[pos:]
+
+        return items
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+
+class RateLimiter:
+    # Token bucket: не больше rate запросов за per секунд
+    def __init__(self, rate: float, per: float = 1.0):
+        self.rate = rate
+        self.per = per
+        self.tokens = rate
+        self.updated_at = None
+        self.paused_until = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if self.updated_at is not None:
+            self.tokens = min(
+                self.rate, self.tokens + (now - self.updated_at) * self.rate / self.per
+            )
+        self.updated_at = now
+
+    def pause(self, seconds: float):
+        # Retry-After: до истечения паузы запросы не отправляются
+        loop = asyncio.get_running_loop()
+        self.paused_until = max(self.paused_until, loop.time() + seconds)
+        self.tokens = 0
+        # Пауза не копит токены: после нее корзина наполняется с нуля
+        self.updated_at = self.paused_until
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+
+        async with self._lock:
+            while True:
+                now = loop.time()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class RateLimiterRegistry:
+    # Лимиты по хосту и по эндпоинту (префиксу пути), общие для всех
+    # клиентов процесса. asyncio.Lock привязан к event loop, поэтому
+    # сами лимитеры создаются на каждый loop, как коннекторы в http_pool
+    def __init__(self):
+        self._limits = {}
+        self._limiters = {}
+
+    def configure(self, host: str, limits: dict):
+        # limits: {None: (rate, per)} для хоста, {"/path": (rate, per)} для эндпоинта
+        for path, limit in limits.items():
+            self._limits.setdefault((host, path), limit)
+
+    def get(self, host: str, path: str):
+        loop = asyncio.get_running_loop()
+
+        for key in [key for key in self._limiters if key[0].is_closed()]:
+            del self._limiters[key]
+
+        limiters = []
+        for (limit_host, prefix), (rate, per) in self._limits.items():
+            if limit_host != host:
+                continue
+            if prefix is None or path.startswith(prefix):
+                key = (loop, limit_host, prefix)
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    limiter = self._limiters[key] = RateLimiter(rate, per)
+                limiters.append(limiter)
+
+        return limiters
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.stats = {}
+
+    def record(self, host: str, waited: float, wire: float, throttled: bool):
+        stats = self.stats.setdefault(
+            host, {"requests": 0, "throttled": 0, "waited": 0.0, "wire": 0.0}
+        )
+        stats["requests"] += 1
+        stats["throttled"] += int(throttled)
+        stats["waited"] += waited
+        stats["wire"] += wire
+
+    def log_summary(self):
+        for host, stats in self.stats.items():
+            logging.info(
+                f"{host}: {stats['requests']} requests, "
+                f"{stats['throttled']} throttled (429), "
+                f"{stats['waited']:.1f}s waiting for rate limit, "
+                f"{stats['wire']:.1f}s on the wire"
+            )
+
+
+rate_limiters = RateLimiterRegistry()
+request_metrics = RequestMetrics()